@@ -0,0 +1,340 @@
+# Banc d'essai hors ligne des détecteurs, sur un dossier d'images déjà capturées
+#
+# Chaque image JPEG du dossier (sous-dossiers compris) est rejouée, dans l'ordre
+# de capture, à travers les détecteurs utilisés par les serveurs. La vérité
+# terrain est lue dans le suffixe _presence_0 / _presence_1 du nom de fichier.
+# Chaque détecteur tourne dans son propre processus, pour mesurer séparément son
+# temps de chargement et sa mémoire maximale (RSS). Le résultat est écrit en
+# JSON (--output) et peut être comparé à un résultat précédent (--baseline)
+# pour repérer les régressions entre deux versions.
+#
+#   python benchmark.py uploads_yolov8_ssim --output bench.json
+#   python benchmark.py captures --detectors haar,ssim --baseline bench.json
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+
+# Banc -> (détecteur de detectors.py, options de detect()) : mêmes réglages que les fonctions des serveurs
+BENCHMARKS = {
+    'haar': ('haar', {}),                                       # server_cv2.detect_presence
+    'yolov8': ('yolov8', {'confidence_threshold': 0}),          # yolov8.detect_presence
+    'yolov8-t0.3': ('yolov8', {'confidence_threshold': 0.3}),   # yolov8+ssim_srv.detect_person_yolov8
+    'yolov3': ('yolov3', {'confidence_threshold': 0.3}),        # yolov3_ssim_srv.detect_person_yolo
+    'ssim': ('ssim', {'threshold': 0.9}),                       # detect_change_by_comparison
+    'mediapipe': ('mediapipe', {}),                             # mediapipe_test.detect_presence
+}
+
+# Rejeu séquentiel, une frame à la fois : l'ordonnanceur par micro-lots de YOLOv8 est réduit
+# à des lots d'une frame sans fenêtre, pour mesurer le modèle et non l'attente d'un lot
+DETECTOR_ENVIRONMENT = {'BATCH_WINDOW_MS': '0', 'BATCH_MAX_SIZE': '1'}
+
+PERCENTILES = (50, 90, 95, 99)
+RESULT_POLL_SECONDS = 1  # intervalle de vérification du processus d'un banc (mort sans résultat)
+LABEL_PATTERN = re.compile(r'_presence_([01])\.jpe?g$', re.IGNORECASE)
+REFERENCE_IMAGE = 'reference_image.jpg'
+
+
+class ReplayContext:
+    """Contexte passé aux détecteurs (comme CameraState) : image de référence propre au banc."""
+
+    def __init__(self, reference_path):
+        self.reference_path = reference_path
+
+
+def find_frames(folder, limit=None):
+    """[(chemin, vérité terrain 0/1 ou None)] triés par date de modification (ordre de capture)."""
+    frames = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(('.jpg', '.jpeg')) and name != REFERENCE_IMAGE:
+                path = os.path.join(root, name)
+                match = LABEL_PATTERN.search(name)
+                frames.append((os.path.getmtime(path), path, int(match.group(1)) if match else None))
+    frames.sort()
+    frames = [(path, label) for _, path, label in frames]
+    return frames[:limit] if limit else frames
+
+
+def pick_reference(folder, frames):
+    """Image de référence de la comparaison SSIM : celle du dossier, sinon la première image vide."""
+    for root, _, files in os.walk(folder):
+        if REFERENCE_IMAGE in files:
+            return os.path.join(root, REFERENCE_IMAGE)
+    return next((path for path, label in frames if label == 0), None)
+
+
+def peak_rss_mb():
+    """Mémoire résidente maximale du processus (Mo), None si non mesurable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # octets sous macOS, Ko sinon
+
+
+def latency_summary(samples):
+    """Percentiles, moyenne et maximum d'une liste de durées (secondes), en millisecondes."""
+    if not samples:
+        return None
+    values = np.array(samples) * 1000
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary['mean'] = round(float(values.mean()), 3)
+    summary['max'] = round(float(values.max()), 3)
+    return summary
+
+
+def accuracy_summary(pairs):
+    """Matrice de confusion et scores à partir de [(vérité, prédiction)] (images étiquetées seulement)."""
+    tp = sum(1 for truth, predicted in pairs if truth and predicted)
+    tn = sum(1 for truth, predicted in pairs if not truth and not predicted)
+    fp = sum(1 for truth, predicted in pairs if not truth and predicted)
+    fn = sum(1 for truth, predicted in pairs if truth and not predicted)
+    precision = tp / (tp + fp) if tp + fp else None
+    recall = tp / (tp + fn) if tp + fn else None
+    return {
+        'labelled': len(pairs), 'tp': tp, 'tn': tn, 'fp': fp, 'fn': fn,
+        'accuracy': (tp + tn) / len(pairs) if pairs else None,
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision and recall else None,
+    }
+
+
+def run_benchmark(name, frames, reference, repeat=1):
+    """Charge le détecteur du banc `name` puis lui fait traiter toutes les frames ; retourne les mesures."""
+    from detectors import get_detector
+    from frame_utils import Frame
+
+    detector_name, options = BENCHMARKS[name]
+    result = {'detector': detector_name, 'options': options}
+    os.environ.update(DETECTOR_ENVIRONMENT)  # lu au chargement du détecteur
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    try:
+        detector = get_detector(detector_name)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+    result['load_seconds'] = round(time.perf_counter() - started, 3)  # chargement + préchauffage
+    result['rss_after_load_mb'] = peak_rss_mb()
+    result['rss_before_load_mb'] = rss_before
+
+    # Référence copiée dans un dossier temporaire : le détecteur SSIM peut la (re)créer
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    context = ReplayContext(os.path.join(workdir, REFERENCE_IMAGE))
+    if reference:
+        shutil.copyfile(reference, context.reference_path)
+
+    stages = {'read': [], 'decode': [], 'detect': [], 'total': []}
+    pairs, errors = [], 0
+    wall_started = time.perf_counter()
+    try:
+        for _ in range(repeat):
+            for path, label in frames:
+                t0 = time.perf_counter()
+                with open(path, 'rb') as f:
+                    data = f.read()
+                t1 = time.perf_counter()
+                try:
+                    frame = Frame(data)  # fichier vide : erreur d'imdecode ; JPEG corrompu : image None
+                    if not frame.valid:
+                        raise ValueError("invalid image")
+                    frame.gray  # conversion partagée par les détecteurs, comptée avec le décodage
+                except (cv2.error, ValueError) as e:
+                    print(f"[ERROR] {name}: {path}: cannot decode ({e})")
+                    errors += 1
+                    continue
+                t2 = time.perf_counter()
+                try:
+                    predicted = bool(detector.detect(frame, context, **options))
+                except Exception as e:
+                    print(f"[ERROR] {name}: {path}: {e}")
+                    errors += 1
+                    continue
+                t3 = time.perf_counter()
+                stages['read'].append(t1 - t0)
+                stages['decode'].append(t2 - t1)
+                stages['detect'].append(t3 - t2)
+                stages['total'].append(t3 - t0)
+                if label is not None:
+                    pairs.append((label, predicted))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.perf_counter() - wall_started
+
+    result.update({
+        'frames': len(stages['total']),
+        'errors': errors,
+        'latency_ms': {stage: latency_summary(samples) for stage, samples in stages.items()},
+        'throughput_fps': round(len(stages['total']) / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'accuracy': accuracy_summary(pairs),
+    })
+    return result
+
+
+def _run_in_child(name, frames, reference, repeat, results):
+    try:
+        result = run_benchmark(name, frames, reference, repeat)
+    except Exception as e:
+        result = {'detector': BENCHMARKS[name][0], 'error': f"{type(e).__name__}: {e}"}
+    results.put(result)
+
+
+def run_isolated(name, frames, reference, repeat=1):
+    """run_benchmark dans un processus neuf : temps de chargement et RSS propres à ce détecteur."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(name, frames, reference, repeat, results))
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            if not process.is_alive():
+                # Processus mort sans résultat (plantage natif, mémoire insuffisante...) : banc en échec
+                try:
+                    result = results.get(timeout=RESULT_POLL_SECONDS)
+                except queue.Empty:
+                    result = {'detector': BENCHMARKS[name][0],
+                              'error': f"benchmark process died (exit code {process.exitcode})"}
+    process.join()
+    if process.exitcode and 'error' not in result:
+        result['error'] = f"exit code {process.exitcode}"
+    return result
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def compare(report, baseline, max_regression):
+    """Affiche l'évolution par rapport à un rapport précédent ; retourne la liste des régressions."""
+    regressions = []
+    for name, result in report['detectors'].items():
+        previous = baseline.get('detectors', {}).get(name)
+        if not previous or 'error' in result or 'error' in previous:
+            continue
+        checks = [
+            ('detect p95 (ms)', result['latency_ms']['detect']['p95'], previous['latency_ms']['detect']['p95'], True),
+            ('throughput (fps)', result['throughput_fps'], previous['throughput_fps'], False),
+            ('accuracy', result['accuracy']['accuracy'], previous['accuracy']['accuracy'], False),
+        ]
+        for label, current, before, lower_is_better in checks:
+            if current is None or not before:
+                continue
+            change = (current - before) / before * 100
+            worse = change > max_regression if lower_is_better else -change > max_regression
+            print(f"[INFO] {name:12} {label:17} {before:>10.3f} -> {current:>10.3f} ({change:+.1f} %)"
+                  + ("  REGRESSION" if worse else ""))
+            if worse:
+                regressions.append(f"{name}: {label}")
+    return regressions
+
+
+def print_summary(report):
+    print(f"{'detector':12} {'frames':>6} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'fps':>7} {'RSS MB':>7} {'acc':>6} {'prec':>6} {'recall':>6}")
+    for name, result in report['detectors'].items():
+        if 'error' in result:
+            print(f"{name:12} failed: {result['error']}")
+            continue
+        detect = result['latency_ms']['detect'] or {}
+        accuracy = result['accuracy']
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else '-'
+
+        print(f"{name:12} {result['frames']:>6} {fmt(result['load_seconds'], '7.2f')} "
+              f"{fmt(detect.get('p50'), '8.1f')} {fmt(detect.get('p95'), '8.1f')} {fmt(detect.get('p99'), '8.1f')} "
+              f"{fmt(result['throughput_fps'], '7.1f')} {fmt(result['peak_rss_mb'], '7.0f')} "
+              f"{fmt(accuracy['accuracy'], '6.3f')} {fmt(accuracy['precision'], '6.3f')} "
+              f"{fmt(accuracy['recall'], '6.3f')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured frames through the presence detectors.")
+    parser.add_argument('folder', help="folder of captured JPEGs (named *_presence_0/1.jpg for ground truth)")
+    parser.add_argument('--detectors', default=','.join(BENCHMARKS),
+                        help=f"comma-separated benchmarks (default: {','.join(BENCHMARKS)})")
+    parser.add_argument('--limit', type=int, help="replay at most this many frames")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the corpus this many times")
+    parser.add_argument('--reference', help="SSIM reference image (default: the folder's reference_image.jpg, "
+                                            "else the first empty frame)")
+    parser.add_argument('--output', help="write the JSON report to this file ('-' for stdout)")
+    parser.add_argument('--baseline', help="previous JSON report to compare with")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="percent change counted as a regression (exit code 1), default 10")
+    parser.add_argument('--in-process', action='store_true',
+                        help="run every detector in this process (load time and RSS are then cumulative)")
+    args = parser.parse_args()
+
+    names = [name for name in args.detectors.split(',') if name]
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    frames = find_frames(args.folder, args.limit)
+    if not frames:
+        parser.error(f"no JPEG found in {args.folder}")
+    reference = args.reference or pick_reference(args.folder, frames)
+    labelled = sum(1 for _, label in frames if label is not None)
+    print(f"[INFO] {len(frames)} frame(s), {labelled} labelled, reference: {reference}")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'folder': os.path.abspath(args.folder),
+        'frames': len(frames),
+        'labelled': labelled,
+        'repeat': args.repeat,
+        'environment': environment(),
+        'detector_environment': DETECTOR_ENVIRONMENT,
+        'detectors': {},
+    }
+    for name in names:
+        print(f"[INFO] Running {name}...")
+        run = run_benchmark if args.in_process else run_isolated
+        report['detectors'][name] = run(name, frames, reference, args.repeat)
+
+    print_summary(report)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('detector_environment') != DETECTOR_ENVIRONMENT:
+            print(f"[WARNING] {args.baseline} was recorded with other detector settings "
+                  f"({baseline.get('detector_environment')}): latencies may not be comparable")
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print(f"[WARNING] {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
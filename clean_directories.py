@@ -1,45 +1,203 @@
-import os
-
-# Directories to clean up
-directories_to_clean = [
-    'uploads_mediapipe',
-    'uploads_yolov8_ssim',
-    'uploads_yolov8',
-    'uploads_cv2',
-    'uploads_yolov3_ssim',
-]
-
-# Path to the reference image
-reference_image_path = 'C:\\Users\\Utilisateur\\Documents\\~Stage2025\\test_server\\uploads\\reference_image.jpg'
-
-def delete_images_in_directory(directory_path):
-    """Delete all images in the directory except the reference image."""
-    if not os.path.exists(directory_path):
-        print(f"[ERROR] Directory {directory_path} does not exist.")
-        return
-    
-    # Walk through the directory
-    for root, dirs, files in os.walk(directory_path):  # Use os.walk to also visit subdirectories
-        for filename in files:
-            file_path = os.path.join(root, filename)
-
-            # Skip the reference image
-            if filename == 'reference_image.jpg':
-                print(f"[INFO] Skipping {filename}, it's the reference image.")
-                continue
-
-            try:
-                os.remove(file_path)  # Delete the file
-                print(f"[INFO] Deleted {filename} from {root}")
-            except Exception as e:
-                print(f"[ERROR] Failed to delete {filename}: {e}")
-
-def main():
-    # Clean the specified directories
-    base_path = 'C:\\Users\\Utilisateur\\Documents\\~Stage2025\\test_server\\'
-    for directory in directories_to_clean:
-        full_directory_path = os.path.join(base_path, directory)
-        delete_images_in_directory(full_directory_path)
-
-if __name__ == '__main__':
-    main()
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DATABASE_FILE = 'presence.db'
+
+# Never deleted, whatever the policy
+REFERENCE_IMAGE = 'reference_image.jpg'
+
+# Default policy: images older than RETENTION_MAX_AGE_DAYS (0 = no age limit) are deleted,
+# then the oldest ones until the folder is under RETENTION_MAX_MB (0 = no size limit)
+DEFAULT_MAX_AGE_DAYS = float(os.environ.get('RETENTION_MAX_AGE_DAYS', 30))
+DEFAULT_MAX_MB = float(os.environ.get('RETENTION_MAX_MB', 0))
+
+# Per-folder overrides, e.g. {'uploads_cv2': {'max_age_days': 7, 'max_mb': 500}}
+POLICIES = {}
+
+# "mark": the presence_logs rows are kept with file_deleted = 1; "delete": the rows are removed
+RETENTION_DB_MODE = os.environ.get('RETENTION_DB_MODE', 'mark')
+
+BATCH_SIZE = 500       # files deleted per batch (one database transaction each)
+BATCH_PAUSE = 0.2      # seconds between two batches, to leave the SD card to the servers
+SWEEP_INTERVAL = 600   # seconds between two sweeps of all the folders
+
+
+class RetentionTarget:
+    """A folder of images and the presence_logs methods whose rows point into it."""
+
+    def __init__(self, folder, methods, skip_dirs=(), max_age_days=None, max_mb=None):
+        policy = POLICIES.get(folder, {})
+        self.folder = folder
+        self.methods = list(methods)
+        self.skip_dirs = set(skip_dirs)  # sub-folders handled by another target
+        self.max_age_days = max_age_days if max_age_days is not None else \
+            policy.get('max_age_days', DEFAULT_MAX_AGE_DAYS)
+        max_mb = max_mb if max_mb is not None else policy.get('max_mb', DEFAULT_MAX_MB)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+
+def iter_images(folder, skip_dirs=()):
+    """Yield (mtime, size, path) for every image under the folder, without building a list."""
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip_dirs:
+                            pending.append(entry.path)
+                    elif entry.name.endswith('.jpg') and entry.name != REFERENCE_IMAGE:
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        yield stat.st_mtime, stat.st_size, entry.path
+        except FileNotFoundError:
+            continue
+
+
+def forget_files(conn, target, filenames):
+    """Mark (or remove) the presence_logs rows that point to the deleted files."""
+    names = target.methods
+    method_condition = f"(method IN ({', '.join('?' * len(names))}) OR " \
+                       f"{' OR '.join(['method LIKE ?'] * len(names))})"
+    method_params = names + [name + ' [%' for name in names]
+    with conn:
+        for start in range(0, len(filenames), 400):
+            chunk = filenames[start:start + 400]
+            where = f"filename IN ({', '.join('?' * len(chunk))}) AND {method_condition}"
+            if RETENTION_DB_MODE == 'delete':
+                conn.execute(f'DELETE FROM presence_logs WHERE {where}', chunk + method_params)
+            else:
+                conn.execute(f'UPDATE presence_logs SET file_deleted = 1 WHERE {where}', chunk + method_params)
+
+
+def remove_empty_dirs(folder, paths):
+    """Remove the date folders (AAAA/MM/JJ) emptied by the deletions."""
+    for directory in sorted({os.path.dirname(path) for path in paths}, reverse=True):
+        while os.path.normpath(directory) != os.path.normpath(folder):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break  # not empty
+            directory = os.path.dirname(directory)
+
+
+def sweep(target, conn, purge=False, batch_size=BATCH_SIZE, pause=BATCH_PAUSE):
+    """Apply the target's policy, oldest images first, in batches. Return the number of deleted files.
+
+    The folder is walked once: the images to delete are chosen from that single
+    listing, then deleted batch_size at a time.
+    """
+    if not os.path.exists(target.folder):
+        return 0
+
+    now = time.time()
+    if purge:
+        cutoff = float('inf')
+    elif target.max_age_days > 0:
+        cutoff = now - target.max_age_days * 86400
+    else:
+        cutoff = None
+    if cutoff is None and not target.max_bytes:
+        return 0
+
+    # Candidates: the images past the age limit, or every image when the size is limited
+    total, candidates = 0, []
+    for mtime, size, path in iter_images(target.folder, target.skip_dirs):
+        total += size
+        if target.max_bytes or mtime < cutoff:
+            candidates.append((mtime, size, path))
+    candidates.sort()
+
+    victims = []
+    for mtime, size, path in candidates:
+        if (cutoff is not None and mtime < cutoff) or (target.max_bytes and total > target.max_bytes):
+            victims.append(path)
+            total -= size
+        else:
+            break
+
+    for start in range(0, len(victims), batch_size):
+        if start:
+            time.sleep(pause)
+        batch = victims[start:start + batch_size]
+        # Database first: a row is never left pointing to a file that is already gone
+        forget_files(conn, target, [os.path.relpath(path, target.folder).replace(os.sep, '/')
+                                    for path in batch])
+        for path in batch:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[ERROR] Failed to delete {path}: {e}")
+        remove_empty_dirs(target.folder, batch)
+        print(f"[INFO] Retention: deleted {len(batch)} image(s) from {target.folder}")
+    return len(victims)
+
+
+class RetentionDaemon(threading.Thread):
+    """Sweeps the targets every `interval` seconds, in the background."""
+
+    def __init__(self, targets, db_path=DATABASE_FILE, interval=SWEEP_INTERVAL):
+        super().__init__(name='retention', daemon=True)
+        self.targets = targets
+        self.db_path = db_path
+        self.interval = interval
+
+    def run(self):
+        while True:
+            run_once(self.targets, self.db_path)
+            time.sleep(self.interval)
+
+
+def run_once(targets, db_path=DATABASE_FILE, purge=False):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA busy_timeout=5000')
+    deleted = 0
+    try:
+        for target in targets:
+            try:
+                deleted += sweep(target, conn, purge)
+            except Exception as e:
+                print(f"[ERROR] Retention failed for {target.folder}: {e}")
+    finally:
+        conn.close()
+    return deleted
+
+
+def pipeline_targets(pipelines):
+    """One target per upload folder and one per fallback_images folder."""
+    targets = []
+    for pipeline in pipelines:
+        names = pipeline.method_names()
+        targets.append(RetentionTarget(pipeline.upload_folder, names,
+                                       skip_dirs=[os.path.basename(pipeline.fallback_folder)]))
+        targets.append(RetentionTarget(pipeline.fallback_folder, names))
+    return targets
+
+
+def main():
+    # python clean_directories.py         : run in the background, one sweep every SWEEP_INTERVAL seconds
+    # python clean_directories.py --once  : a single sweep
+    # python clean_directories.py --all   : delete every image (except the reference images)
+    from database_setup import init_db
+    from presence_server import PIPELINES
+
+    init_db()
+    targets = pipeline_targets(PIPELINES.values())
+    if '--all' in sys.argv or '--once' in sys.argv:
+        print(f"[INFO] {run_once(targets, purge='--all' in sys.argv)} image(s) deleted.")
+        return
+    daemon = RetentionDaemon(targets)
+    daemon.start()
+    daemon.join()
+
+
+if __name__ == '__main__':
+    main()
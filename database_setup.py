@@ -1,60 +1,183 @@
-import sqlite3
-
-DB_PATH = 'presence.db'
-
-def clear_all_entries():
-    """Clear all entries from the presence_logs table."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM presence_logs')
-    conn.commit()
-    conn.close()
-    print("[INFO] All entries have been deleted.")
-
-def clear_last_n_entries(n):
-    """Clear the last n entries from the presence_logs table."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(''' 
-        DELETE FROM presence_logs
-        WHERE id IN (
-            SELECT id FROM presence_logs ORDER BY id DESC LIMIT ?
-        )
-    ''', (n,))
-    conn.commit()
-    conn.close()
-    print(f"[INFO] Last {n} entries have been deleted.")
-
-def init_db():
-    """Initialize the database and create the necessary tables if they don't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Create presence_logs table with try_id
-    cursor.execute(''' 
-        CREATE TABLE IF NOT EXISTS presence_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT,
-            presence INTEGER,
-            fallback_used INTEGER,
-            method TEXT,
-            timestamp TEXT,
-            try_id INTEGER
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-    print("[INFO] Database initialized.")
-
-if __name__ == '__main__':
-    # Initialize the database (if needed)
-    init_db()
-
-    # Choose one of the options below based on what you need:
-    
-    # Option 1: Clear all entries
-    clear_all_entries()
-    
-    # Option 2: Clear last N rows (set N to the number of rows you want to delete)
+import sqlite3
+
+DB_PATH = 'presence.db'
+
+def clear_all_entries():
+    """Clear all entries from the presence_logs table."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM presence_logs')
+    cursor.execute('DELETE FROM try_id_counters')  # les séquences de try_id repartent de 1
+    reset_rollups(cursor)
+    conn.commit()
+    conn.close()
+    print("[INFO] All entries have been deleted.")
+
+def clear_last_n_entries(n):
+    """Clear the last n entries from the presence_logs table."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(''' 
+        DELETE FROM presence_logs
+        WHERE id IN (
+            SELECT id FROM presence_logs ORDER BY id DESC LIMIT ?
+        )
+    ''', (n,))
+    reset_rollups(cursor)  # agrégats recalculés au prochain passage de rollups.update_rollups
+    conn.commit()
+    conn.close()
+    print(f"[INFO] Last {n} entries have been deleted.")
+
+def create_tables(cursor):
+    """Create the base tables if they don't exist."""
+    # Create presence_logs table with try_id
+    cursor.execute(''' 
+        CREATE TABLE IF NOT EXISTS presence_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            presence INTEGER,
+            fallback_used INTEGER,
+            method TEXT,
+            timestamp TEXT,
+            try_id INTEGER
+        )
+    ''')
+
+    # Dernier try_id attribué par séquence (une ligne par méthode, voir db_logger.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS try_id_counters (
+            counter TEXT PRIMARY KEY,
+            last_try_id INTEGER NOT NULL
+        )
+    ''')
+
+
+# Migrations du schéma, appliquées dans l'ordre. PRAGMA user_version contient
+# le numéro de la dernière migration appliquée à la base.
+def migration_1(cursor):
+    """Index, horodatage entier (ts_epoch) et table de correspondance des méthodes."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS methods (
+            method_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('ALTER TABLE presence_logs ADD COLUMN ts_epoch INTEGER')
+    cursor.execute('ALTER TABLE presence_logs ADD COLUMN method_id INTEGER REFERENCES methods(method_id)')
+
+    # Reprise des lignes existantes (timestamp est en heure locale)
+    cursor.execute('INSERT OR IGNORE INTO methods (name) SELECT DISTINCT method FROM presence_logs')
+    cursor.execute('''
+        UPDATE presence_logs SET
+            ts_epoch = CAST(strftime('%s', timestamp, 'utc') AS INTEGER),
+            method_id = (SELECT method_id FROM methods WHERE name = presence_logs.method)
+    ''')
+
+    # Les anciens scripts n'écrivent que les colonnes d'origine : le déclencheur complète la ligne
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS presence_logs_fill_columns
+        AFTER INSERT ON presence_logs
+        WHEN NEW.ts_epoch IS NULL OR NEW.method_id IS NULL
+        BEGIN
+            INSERT OR IGNORE INTO methods (name) VALUES (NEW.method);
+            UPDATE presence_logs SET
+                ts_epoch = COALESCE(NEW.ts_epoch, CAST(strftime('%s', NEW.timestamp, 'utc') AS INTEGER)),
+                method_id = COALESCE(NEW.method_id, (SELECT method_id FROM methods WHERE name = NEW.method))
+            WHERE id = NEW.id;
+        END
+    ''')
+
+    # Historique (ORDER BY timestamp DESC, filtré ou non par méthode) et reprise des try_id
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_logs_timestamp ON presence_logs (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_logs_method_timestamp ON presence_logs (method, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_logs_method_try_id ON presence_logs (method, try_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_logs_method_id_ts ON presence_logs (method_id, ts_epoch)')
+
+
+def migration_2(cursor):
+    """Identifiant de caméra et agrégats d'occupation (voir rollups.py)."""
+    cursor.execute('ALTER TABLE presence_logs ADD COLUMN device_id TEXT')  # NULL : caméra unique
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS presence_rollups (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            method_id INTEGER NOT NULL REFERENCES methods(method_id),
+            device_id TEXT NOT NULL DEFAULT '',
+            frames INTEGER NOT NULL,
+            presences INTEGER NOT NULL,
+            fallbacks INTEGER NOT NULL,
+            PRIMARY KEY (granularity, method_id, device_id, bucket)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_rollups_bucket ON presence_rollups (granularity, bucket)')
+    # Dernière ligne de presence_logs déjà agrégée
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO rollup_state (name, last_id) VALUES ('presence_logs', 0)")
+
+
+def migration_3(cursor):
+    """Suivi des images supprimées par la rétention (voir clean_directories.py)."""
+    cursor.execute('ALTER TABLE presence_logs ADD COLUMN file_deleted INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_logs_filename ON presence_logs (filename)')
+
+
+def reset_rollups(cursor):
+    """Empty the rollups so that they are rebuilt from the remaining rows."""
+    cursor.execute('DELETE FROM presence_rollups')
+    cursor.execute("UPDATE rollup_state SET last_id = 0 WHERE name = 'presence_logs'")
+
+
+MIGRATIONS = [migration_1, migration_2, migration_3]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """Apply the pending migrations, each in its own transaction."""
+    while True:
+        conn.execute('BEGIN IMMEDIATE')  # un seul processus migre à la fois
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            conn.execute('COMMIT')
+            return version
+        try:
+            MIGRATIONS[version](conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        print(f"[INFO] Database migrated to schema version {version + 1}.")
+
+
+def ensure_schema(conn):
+    """Create the tables if needed and bring the schema up to date."""
+    create_tables(conn.cursor())
+    conn.commit()
+    # Mode WAL : les lectures (interface graphique) ne bloquent plus les écritures
+    conn.execute('PRAGMA journal_mode=WAL')
+    return migrate(conn)
+
+
+def init_db():
+    """Initialize the database and create the necessary tables if they don't exist."""
+    conn = sqlite3.connect(DB_PATH)
+    ensure_schema(conn)
+    conn.close()
+    print("[INFO] Database initialized.")
+
+if __name__ == '__main__':
+    # Initialize the database (if needed)
+    init_db()
+
+    # Choose one of the options below based on what you need:
+    
+    # Option 1: Clear all entries
+    clear_all_entries()
+    
+    # Option 2: Clear last N rows (set N to the number of rows you want to delete)
     #clear_last_n_entries(n)
\ No newline at end of file
@@ -0,0 +1,149 @@
+# Journalisation des détections dans presence.db
+#
+# Une seule connexion SQLite, ouverte pour toute la durée du processus (mode
+# WAL), utilisée par un thread d'écriture : les requêtes ne font que déposer
+# leur ligne dans une file, et le thread regroupe les lignes arrivées en même
+# temps dans une seule transaction (un seul fsync). Le try_id est tiré d'une
+# table de compteurs (une ligne par méthode), sans parcourir presence_logs.
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from database_setup import ensure_schema
+from rollups import update_rollups
+
+DATABASE_FILE = 'presence.db'
+
+
+class PresenceLogger:
+    """Écrivain en arrière-plan pour la table presence_logs.
+
+    - batch_size : nombre maximal de lignes par transaction
+    - flush_interval_ms : attente maximale, après la première ligne, des lignes suivantes du même lot
+    """
+
+    def __init__(self, db_path=DATABASE_FILE, batch_size=64, flush_interval_ms=200, max_queue=10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seeded = set()  # compteurs dont l'existence a déjà été vérifiée par cette connexion
+        self._method_ids = {}  # nom de méthode -> methods.method_id
+        self._thread = threading.Thread(target=self._run, name='presence-logger', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, 5)
+
+    def log(self, filename, presence, fallback_used, method, timestamp, counter, counter_methods=None,
+            device_id=None):
+        """Met une ligne en file d'attente.
+
+        `counter` identifie la séquence de try_id (ex. la méthode principale du
+        pipeline) ; `counter_methods` liste les méthodes qui partageaient cette
+        séquence dans les anciennes données, pour initialiser le compteur.
+        `device_id` : caméra émettrice (None pour la caméra unique historique) ;
+        le compteur n'est initialisé qu'à partir des lignes de cette caméra.
+        """
+        self._queue.put((filename, presence, fallback_used, method, timestamp, counter,
+                         tuple(counter_methods or (counter,)), device_id))
+
+    def flush(self, timeout=None):
+        """Attend que toutes les lignes en file soient écrites (arrêt du serveur, tests)."""
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None)  # transactions gérées explicitement
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # en WAL : fsync au checkpoint, pas à chaque commit
+        conn.execute('PRAGMA busy_timeout=5000')   # plusieurs serveurs peuvent écrire dans la même base
+        ensure_schema(conn)  # une base existante est migrée au premier démarrage du serveur
+        return conn
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                break
+        return batch
+
+    def _next_try_id(self, cursor, counter, counter_methods, device_id=None):
+        if counter not in self._seeded:
+            # Une seule fois par compteur : reprise de la séquence depuis les données existantes
+            placeholders = ', '.join('?' * len(counter_methods))
+            likes = ' OR '.join(['method LIKE ?'] * len(counter_methods))
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO try_id_counters (counter, last_try_id)
+                SELECT ?, COALESCE(MAX(try_id), 0) FROM presence_logs
+                WHERE (method IN ({placeholders}) OR {likes}) AND device_id IS ?
+            ''', (counter,) + counter_methods + tuple(m + ' [%' for m in counter_methods) + (device_id,))
+            self._seeded.add(counter)
+        cursor.execute('UPDATE try_id_counters SET last_try_id = last_try_id + 1 WHERE counter = ?', (counter,))
+        cursor.execute('SELECT last_try_id FROM try_id_counters WHERE counter = ?', (counter,))
+        return cursor.fetchone()[0]
+
+    def _method_id(self, cursor, method):
+        method_id = self._method_ids.get(method)
+        if method_id is None:
+            cursor.execute('INSERT OR IGNORE INTO methods (name) VALUES (?)', (method,))
+            cursor.execute('SELECT method_id FROM methods WHERE name = ?', (method,))
+            method_id = self._method_ids[method] = cursor.fetchone()[0]
+        return method_id
+
+    def _write(self, conn, batch):
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for filename, presence, fallback_used, method, timestamp, counter, counter_methods, device_id in batch:
+                try_id = self._next_try_id(cursor, counter, counter_methods, device_id)
+                ts_epoch = int(time.mktime(time.strptime(timestamp, '%Y-%m-%d %H:%M:%S')))
+                cursor.execute('''
+                    INSERT INTO presence_logs (filename, presence, fallback_used, method, timestamp, try_id,
+                                               ts_epoch, method_id, device_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (filename, presence, fallback_used, method, timestamp, try_id,
+                      ts_epoch, self._method_id(cursor, method), device_id))
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            self._seeded.clear()
+            self._method_ids.clear()
+            raise
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._collect()
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._write(conn, batch)
+                print(f"[INFO] Logged {len(batch)} row(s) to DB")
+                update_rollups(conn)
+            except Exception as e:
+                print(f"[ERROR] DB log failed for {len(batch)} row(s): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_logger(db_path=DATABASE_FILE):
+    """Écrivain partagé par toutes les requêtes du processus."""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = PresenceLogger(db_path)
+        return _logger
+
+
+def existing_logger():
+    """Écrivain du processus s'il a déjà été créé, sinon None (sans ouvrir la base)."""
+    with _logger_lock:
+        return _logger
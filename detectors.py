@@ -0,0 +1,396 @@
+# Registre des détecteurs de présence
+#
+# Chaque type de détecteur (haar, yolov8, yolov3, ssim, mediapipe) n'est
+# instancié qu'une seule fois par processus et partagé par toutes les routes.
+# Les bibliothèques lourdes (ultralytics, mediapipe...) ne sont importées
+# qu'au chargement du détecteur correspondant, qui peut se faire en arrière-plan
+# (chargement puis préchauffage sur une image neutre) pendant que le serveur
+# HTTP répond déjà.
+# Pour ajouter une méthode : une classe héritant de Detector, décorée par @register.
+import math
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from frame_utils import Frame
+from lru_store import LRUStore
+from ssim_engine import ChangeDetector
+
+DETECTORS = {}  # nom -> classe de détecteur
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def register(name):
+    """Décorateur qui ajoute une classe de détecteur au registre."""
+    def decorator(cls):
+        cls.name = name
+        DETECTORS[name] = cls
+        return cls
+    return decorator
+
+
+def _instance(name):
+    with _instances_lock:
+        detector = _instances.get(name)
+        if detector is None:
+            if name not in DETECTORS:
+                raise KeyError(f"Unknown detector: {name}")
+            detector = _instances[name] = DETECTORS[name]()
+        return detector
+
+
+def get_detector(name, timeout=None):
+    """Retourne l'instance partagée du détecteur.
+
+    Sans `timeout`, le chargement se fait (si besoin) de façon bloquante. Avec
+    un `timeout` en secondes, le chargement est lancé en arrière-plan et None
+    est retourné si le détecteur n'est pas prêt à temps.
+    """
+    detector = _instance(name)
+    if timeout is None:
+        detector.ensure_loaded()
+        return detector
+    detector.load_in_background()
+    return detector if detector.wait_ready(timeout) else None
+
+
+def preload(names):
+    """Lance le chargement et le préchauffage des détecteurs en arrière-plan."""
+    for name in names:
+        _instance(name).load_in_background()
+
+
+def loaded_detectors():
+    """Détecteurs déjà instanciés dans ce processus."""
+    with _instances_lock:
+        return dict(_instances)
+
+
+def readiness():
+    """État de chaque détecteur instancié (pour la route /ready)."""
+    return {name: detector.describe() for name, detector in loaded_detectors().items()}
+
+
+class Detector:
+    """Classe de base : load() charge le modèle, warm_up() le préchauffe,
+    detect() retourne une valeur vraie si présence.
+
+    États successifs : not_loaded -> loading -> warming_up -> ready (ou failed).
+    """
+
+    name = None
+    method_tag = ''  # suffixe éventuel de presence_logs.method (ex. profil YOLOv3)
+
+    def __init__(self):
+        self.state = 'not_loaded'
+        self.error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._background = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout):
+        return self._ready.wait(timeout)
+
+    def ensure_loaded(self):
+        """Charge puis préchauffe le détecteur (bloquant, une seule fois)."""
+        if self._ready.is_set():
+            return
+        with self._load_lock:
+            if self.state == 'ready':
+                return
+            if self.state == 'failed':
+                raise RuntimeError(f"Detector {self.name} failed to load: {self.error}")
+
+            started = time.monotonic()
+            try:
+                self.state = 'loading'
+                self.load()
+                self.state = 'warming_up'
+                self.warm_up(Frame.from_image(np.zeros((480, 640, 3), np.uint8)))
+            except Exception as e:
+                self.state = 'failed'
+                self.error = str(e)
+                print(f"[ERROR] Detector {self.name} failed to load: {e}")
+                raise
+            self.load_seconds = time.monotonic() - started
+            self.state = 'ready'
+            self._ready.set()
+            print(f"[INFO] Detector {self.name} ready in {self.load_seconds:.1f} s")
+
+    def load_in_background(self):
+        """Lance ensure_loaded() dans un thread, une seule fois."""
+        with _instances_lock:
+            if self._background is not None or self._ready.is_set():
+                return
+            self._background = threading.Thread(target=self._load_quietly, name=f"load-{self.name}", daemon=True)
+        self._background.start()
+
+    def _load_quietly(self):
+        try:
+            self.ensure_loaded()
+        except Exception:
+            pass  # l'erreur est conservée dans self.error et exposée par /ready
+
+    def describe(self):
+        return {'state': self.state, 'load_seconds': self.load_seconds, 'error': self.error}
+
+    def load(self):
+        pass
+
+    def warm_up(self, frame):
+        """Première inférence sur une image neutre, pour que la première vraie requête n'en paie pas le coût."""
+        pass
+
+    def detect(self, frame, context=None, **options):
+        """`context` fournit les chemins propres à l'appelant (ex. reference_path pour SSIM)."""
+        raise NotImplementedError
+
+
+def face_size_range(frame_width, hfov_degrees, min_distance_m, max_distance_m, face_width_m=0.16):
+    """Largeur d'un visage en pixels (min, max) selon la géométrie de la caméra :
+    champ de vision horizontal et distances extrêmes des personnes à la caméra."""
+    focal_px = frame_width / (2 * math.tan(math.radians(hfov_degrees) / 2))
+    return int(focal_px * face_width_m / max_distance_m), int(math.ceil(focal_px * face_width_m / min_distance_m))
+
+
+class FaceTrack:
+    """Visages de la frame précédente d'une caméra (mode suivi)."""
+
+    def __init__(self):
+        self.faces = []   # [(x, y, w, h)] en pixels de l'image d'origine
+        self.frames = 0
+        self.lock = threading.Lock()
+
+
+@register('haar')
+class HaarDetector(Detector):
+    """Détection de visages avec un classificateur Haar cascade fourni par OpenCV.
+
+    Avec HAAR_TRACKING=1, la recherche se fait d'abord autour des visages de la
+    frame précédente (zone élargie de HAAR_ROI_PADDING), sur une image réduite et
+    entre une taille minimale et maximale de visage ; l'image entière n'est
+    parcourue que si cette recherche échoue, ou toutes les HAAR_FULL_SCAN_EVERY frames
+    (1 : image entière à chaque frame ; les valeurs inférieures valent 1).
+    """
+
+    CASCADE_WINDOW = 24  # taille de la fenêtre d'apprentissage de la cascade (px)
+
+    def load(self):
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.tracking = os.environ.get('HAAR_TRACKING', '0') == '1'
+        self.full_scan_every = max(1, int(os.environ.get('HAAR_FULL_SCAN_EVERY', 10)))
+        self.roi_padding = float(os.environ.get('HAAR_ROI_PADDING', 0.5))
+        # Tailles de visage (px, image d'origine) : explicites, ou déduites de la géométrie de la caméra
+        self.min_face = int(os.environ.get('HAAR_MIN_FACE', 30))
+        self.max_face = int(os.environ.get('HAAR_MAX_FACE', 0)) or None
+        self.camera_hfov = float(os.environ.get('HAAR_CAMERA_HFOV', 0))  # degrés (ex. 66 pour l'OV2640)
+        self.min_distance = float(os.environ.get('HAAR_MIN_DISTANCE_M', 0.5))
+        self.max_distance = float(os.environ.get('HAAR_MAX_DISTANCE_M', 5))
+        self.scale = float(os.environ.get('HAAR_SCALE', 0))  # 0 : réduction automatique
+        self._tracks = LRUStore()
+
+    def warm_up(self, frame):
+        self.cascade.detectMultiScale(frame.gray)
+
+    def face_bounds(self, frame_width):
+        if self.camera_hfov:
+            return face_size_range(frame_width, self.camera_hfov, self.min_distance, self.max_distance)
+        return self.min_face, self.max_face
+
+    def scan(self, gray, min_face, max_face, region=None):
+        """detectMultiScale sur `region` (x, y, w, h) de l'image réduite de sorte que
+        le plus petit visage recherché couvre la fenêtre de la cascade."""
+        scale = self.scale or min(1.0, self.CASCADE_WINDOW / max(min_face, 1))
+        x0, y0 = 0, 0
+        if region is not None:
+            x0, y0, w, h = region
+            gray = gray[y0:y0 + h, x0:x0 + w]
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = max(int(min_face * scale), self.CASCADE_WINDOW)
+        if min(gray.shape[:2]) < min_size:
+            return []
+        bounds = {'minSize': (min_size, min_size)}
+        if max_face:  # sans taille maximale, maxSize est omis (OpenCV refuse un tuple vide)
+            bounds['maxSize'] = (int(max_face * scale),) * 2
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, **bounds)
+        return [(int(x / scale) + x0, int(y / scale) + y0, int(w / scale), int(h / scale)) for x, y, w, h in faces]
+
+    def track(self, context):
+        # Une piste par caméra (et par pipeline), oubliée quand la caméra n'envoie plus d'images
+        return self._tracks.get_or_create(context.reference_path, lambda key: FaceTrack())
+
+    def search_region(self, faces, width, height):
+        """Rectangle englobant les visages précédents, élargi de roi_padding fois leur taille."""
+        x1 = min(x - self.roi_padding * w for x, y, w, h in faces)
+        y1 = min(y - self.roi_padding * h for x, y, w, h in faces)
+        x2 = max(x + w + self.roi_padding * w for x, y, w, h in faces)
+        y2 = max(y + h + self.roi_padding * h for x, y, w, h in faces)
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        return x1, y1, min(width, int(x2)) - x1, min(height, int(y2)) - y1
+
+    def find_faces(self, frame, context=None):
+        gray = frame.gray
+        height, width = gray.shape[:2]
+        min_face, max_face = self.face_bounds(width)
+        if not self.tracking or context is None:  # sans contexte (pool de processus) : pas de suivi
+            if self.tracking:
+                return self.scan(gray, min_face, max_face)
+            if self.scale or self.max_face or self.camera_hfov:
+                return self.scan(gray, min_face, max_face)
+            return self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+
+        track = self.track(context)
+        with track.lock:
+            track.frames += 1
+            faces = []
+            if track.faces and track.frames % self.full_scan_every:
+                faces = self.scan(gray, min_face, max_face, self.search_region(track.faces, width, height))
+            if not faces:
+                faces = self.scan(gray, min_face, max_face)  # recherche ratée, ou frame de contrôle
+            track.faces = faces
+        return faces
+
+    def detect(self, frame, context=None):
+        faces = self.find_faces(frame, context)
+        if len(faces) > 0:  # si au moins un visage est détecté
+            print(f"[INFO] {len(faces)} face(s) detected.")
+            return True
+        print("[INFO] No faces detected.")
+        return False
+
+
+@register('yolov8')
+class YoloV8Detector(Detector):
+    """YOLOv8 nano, derrière l'ordonnanceur d'inférence par micro-lots."""
+
+    def load(self):
+        from ultralytics import YOLO
+        from inference_scheduler import BatchScheduler
+
+        self.model = YOLO(os.environ.get('YOLOV8_WEIGHTS', 'yolov8n.pt'))
+        self.scheduler = BatchScheduler(
+            self.model,
+            window_ms=float(os.environ.get('BATCH_WINDOW_MS', 20)),
+            max_batch=int(os.environ.get('BATCH_MAX_SIZE', 8)),
+            max_latency_ms=float(os.environ.get('BATCH_MAX_LATENCY_MS', 2000)),
+        )
+
+    def warm_up(self, frame):
+        self.model(frame.image, verbose=False)
+
+    def detect(self, frame, context=None, confidence_threshold=0.3):
+        result = self.scheduler.predict(frame.image)
+        for box in result.boxes:
+            conf = float(box.conf[0])
+            if conf > confidence_threshold and self.model.names[int(box.cls[0])] == 'person':
+                print(f"[INFO] Person detected by YOLOv8 with confidence: {conf:.2f}")
+                return True
+        print("[INFO] No person detected by YOLOv8.")
+        return False
+
+
+@register('yolov3')
+class YoloV3Detector(Detector):
+    """YOLOv3 (cv2.dnn) avec profil d'inférence configurable et post-traitement vectorisé."""
+
+    YOLO_PATH = 'yolo'
+    SAMPLE_FOLDER = 'uploads_yolov3_ssim'  # images utilisées par l'auto-réglage du profil
+
+    def load(self):
+        from yolov3_detector import select_profile, DEFAULT_PROFILE
+
+        self.net = cv2.dnn.readNetFromDarknet(f"{self.YOLO_PATH}/yolov3.cfg", f"{self.YOLO_PATH}/yolov3.weights")
+        layer_names = self.net.getLayerNames()
+        self.output_layers = [layer_names[i - 1] for i in self.net.getUnconnectedOutLayers().flatten()]
+        with open(f"{self.YOLO_PATH}/coco.names", 'r') as f:
+            self.classes = [line.strip() for line in f.readlines()]
+        self.person_class_id = self.classes.index("person")
+        self.profile = select_profile(
+            self.net, self.output_layers,
+            name=os.environ.get('YOLO3_PROFILE', DEFAULT_PROFILE),
+            sample_folder=self.SAMPLE_FOLDER,
+            latency_budget_ms=float(os.environ.get('YOLO3_LATENCY_BUDGET_MS', 1000)),
+        )
+        self.method_tag = self.profile.method_tag
+        self._net_lock = threading.Lock()  # cv2.dnn.Net n'est pas utilisable par plusieurs threads à la fois
+
+    def warm_up(self, frame):
+        self.find_people(frame)
+
+    def find_people(self, frame, confidence_threshold=0.3, apply_nms=True, nms_threshold=0.4):
+        """Personnes détectées : liste de (x, y, w, h, confiance)."""
+        from yolov3_detector import decode_person_detections, forward
+
+        with self._net_lock:
+            outputs = forward(self.net, self.output_layers, frame.image, self.profile)
+        height, width = frame.image.shape[:2]
+        return decode_person_detections(outputs, width, height, confidence_threshold,
+                                        nms_threshold=nms_threshold, apply_nms=apply_nms,
+                                        class_id=self.person_class_id)
+
+    def detect(self, frame, context=None, confidence_threshold=0.3):
+        people = self.find_people(frame, confidence_threshold, apply_nms=False)
+        if people:
+            print(f"[INFO] YOLO: Person detected (confidence: {max(p[4] for p in people):.2f})")
+            return True
+        print("[INFO] YOLO: No person detected.")
+        return False
+
+
+@register('ssim')
+class SsimDetector(Detector):
+    """Comparaison SSIM avec l'image de référence de l'appelant (context.reference_path)."""
+
+    def load(self):
+        self._change_detectors = LRUStore()  # un par caméra active ; la référence est relue sur le disque
+
+    def change_detector(self, reference_path):
+        return self._change_detectors.get_or_create(reference_path, ChangeDetector)
+
+    def detect(self, frame, context=None, threshold=0.9):
+        result = self.change_detector(context.reference_path).compare(frame, threshold)
+        if result is None:
+            print("[INFO] Reference image not found. Saving current image as reference.")
+            return False
+        score = f"{result.score:.4f}" if result.score is not None else f"< {result.score_bound:.4f}"
+        print(f"[INFO] SSIM score: {score} ({len(result.changed_tiles)} changed tile(s), "
+              f"{result.tiles_checked}/{result.tiles_total} checked)")
+        return result
+
+
+@register('mediapipe')
+class MediaPipeDetector(Detector):
+    """Détection d'une posture humaine avec MediaPipe Pose."""
+
+    def load(self):
+        import mediapipe as mp
+
+        self.pose = mp.solutions.pose.Pose(static_image_mode=True, model_complexity=1)
+        self._pose_lock = threading.Lock()
+
+    def warm_up(self, frame):
+        self.pose.process(cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB))
+
+    def detect(self, frame, context=None):
+        try:
+            image_rgb = cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB)
+            with self._pose_lock:
+                results = self.pose.process(image_rgb)
+        except Exception as e:
+            print(f"[ERROR] Exception in detect_presence: {e}")
+            return False
+
+        if results.pose_landmarks:
+            print("[INFO] Person detected by MediaPipe")
+            return True
+        print("[INFO] No person detected by MediaPipe")
+        return False
@@ -0,0 +1,116 @@
+# Stockage des images reçues, nommées par leur contenu
+#
+# Chaque image est rangée dans <dossier>/AAAA/MM/JJ/<empreinte>_presence_X.jpg,
+# où l'empreinte est un hachage des octets JPEG : deux images reçues dans la
+# même seconde ne s'écrasent plus, et une image identique n'est écrite qu'une
+# fois. Pour les images sans présence, une empreinte perceptuelle (dHash, 64
+# bits) est comparée à celles des dernières images enregistrées : une scène
+# vide quasi identique renvoie le chemin de l'image déjà stockée, que plusieurs
+# lignes de presence_logs référencent alors, sans nouvelle écriture sur la carte SD.
+import hashlib
+import os
+import threading
+import cv2
+import numpy as np
+
+DEDUPE_DISTANCE = 4  # bits différents (sur 64) en dessous desquels deux images vides sont « identiques »
+RECENT_HASHES = 8    # images vides récentes avec lesquelles chaque nouvelle image est comparée
+
+
+def perceptual_hash(gray):
+    """dHash 64 bits : signe du gradient horizontal sur une vignette 9x8."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameStore:
+    """Images d'un dossier, rangées par date et nommées par empreinte de contenu."""
+
+    def __init__(self, root, dedupe_distance=DEDUPE_DISTANCE, recent=RECENT_HASHES, prefix=''):
+        self.root = root
+        self.prefix = prefix  # sous-dossier d'une caméra (ex. 'devices/cam1/'), inclus dans les chemins relatifs
+        self.dedupe_distance = dedupe_distance  # négatif : pas de déduplication
+        self.recent = recent
+        self.deduplicated = 0
+        self._recent_absent = []  # [(dHash, chemin relatif, jour)], plus récente en dernier
+        self._shards = set()      # dossiers de date déjà créés
+        self._pending = set()     # chemins dont l'écriture est en file (voir persistence.py)
+        self._lock = threading.Lock()
+
+    def relative_path(self, frame, presence, when):
+        """Chemin (relatif au dossier, séparateurs « / ») sous lequel la frame est stockée."""
+        digest = hashlib.blake2b(frame.data, digest_size=10).hexdigest()
+        return f"{self.prefix}{when:%Y/%m/%d}/{digest}_presence_{presence}.jpg"
+
+    def path(self, relative_path):
+        return os.path.join(self.root, *relative_path.split('/'))
+
+    def find_duplicate(self, frame, when):
+        """Image vide quasi identique déjà stockée le même jour : (chemin relatif ou None, dHash)."""
+        frame_hash = perceptual_hash(frame.gray)
+        if self.dedupe_distance < 0:
+            return None, frame_hash
+        day = when.date()
+        with self._lock:
+            for stored_hash, relative_path, stored_day in reversed(self._recent_absent):
+                if stored_day == day and hamming(frame_hash, stored_hash) <= self.dedupe_distance \
+                        and self._stored(self.path(relative_path)):  # pas supprimée par la rétention
+                    self.deduplicated += 1
+                    return relative_path, frame_hash
+        return None, frame_hash
+
+    def _stored(self, full_path):
+        return full_path in self._pending or os.path.exists(full_path)
+
+    def store(self, frame, presence, when):
+        """Réserve l'emplacement de la frame : (chemin relatif, chemin complet à écrire ou None).
+
+        Le chemin complet est None si le même contenu (ou une image vide quasi
+        identique) est déjà stocké. Sinon l'appelant écrit frame.data à cet
+        emplacement, puis appelle written().
+        """
+        frame_hash = None
+        if not presence:
+            duplicate, frame_hash = self.find_duplicate(frame, when)
+            if duplicate is not None:
+                return duplicate, None
+
+        relative_path = self.relative_path(frame, presence, when)
+        full_path = self.path(relative_path)
+        shard = os.path.dirname(full_path)
+        if shard not in self._shards:
+            os.makedirs(shard, exist_ok=True)
+            self._shards.add(shard)
+
+        with self._lock:
+            if frame_hash is not None:
+                self._recent_absent.append((frame_hash, relative_path, when.date()))
+                del self._recent_absent[:-self.recent]
+            if self._stored(full_path):  # même contenu : déjà écrit (ou en cours d'écriture)
+                return relative_path, None
+            self._pending.add(full_path)
+        return relative_path, full_path
+
+    def written(self, full_path):
+        with self._lock:
+            self._pending.discard(full_path)
+
+    def save(self, frame, presence, when):
+        """Stocke la frame immédiatement (si besoin) et retourne son chemin relatif."""
+        relative_path, full_path = self.store(frame, presence, when)
+        if full_path is not None:
+            try:
+                try:
+                    frame.save(full_path)
+                except FileNotFoundError:
+                    # Dossier du jour vidé puis supprimé par la rétention entre-temps
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    frame.save(full_path)
+            finally:
+                self.written(full_path)
+        return relative_path
@@ -0,0 +1,94 @@
+# Outils partagés pour manipuler les images reçues par les serveurs
+import os
+import cv2
+import numpy as np
+from lru_store import LRUStore
+
+
+class Frame:
+    """Image reçue par un serveur, décodée une seule fois en mémoire.
+
+    Les octets JPEG d'origine sont conservés pour être écrits tels quels sur le
+    disque (aucun ré-encodage) et tous les détecteurs (YOLO, SSIM, Haar...)
+    lisent le même tableau numpy.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        self._gray = None
+
+    @classmethod
+    def from_upload(cls, file):
+        """Construit une Frame à partir d'un fichier Flask (request.files)."""
+        return cls(file.read())
+
+    @classmethod
+    def from_image(cls, image):
+        """Construit une Frame à partir d'une image déjà décodée (ex. image de préchauffage)."""
+        return cls(cv2.imencode('.jpg', image)[1].tobytes())
+
+    @classmethod
+    def wrap(cls, image):
+        """Frame construite autour d'une image décodée, sans octets JPEG (détection uniquement)."""
+        frame = cls.__new__(cls)
+        frame.data = None
+        frame.image = image
+        frame._gray = None
+        return frame
+
+    @classmethod
+    def from_path(cls, path):
+        """Construit une Frame à partir d'une image déjà présente sur le disque."""
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    @property
+    def valid(self):
+        return self.image is not None
+
+    @property
+    def gray(self):
+        """Version en niveaux de gris, calculée au premier accès puis réutilisée."""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def save(self, path):
+        """Écrit les octets JPEG d'origine à leur emplacement définitif."""
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+
+# Cache des images de référence en niveaux de gris : {chemin: (mtime, image)}, une par caméra active
+_reference_cache = LRUStore()
+
+
+def load_reference_gray(path):
+    """Retourne l'image de référence en niveaux de gris, ou None si elle n'existe pas.
+
+    L'image n'est relue sur le disque que si le fichier a été modifié.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cached = _reference_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    reference = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if reference is not None:
+        _reference_cache.put(path, (mtime, reference))
+    return reference
+
+
+def save_reference(path, frame):
+    """Enregistre la frame courante comme nouvelle image de référence."""
+    try:
+        frame.save(path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)  # dossier de la caméra supprimé entre-temps
+        frame.save(path)
+    _reference_cache.pop(path, None)
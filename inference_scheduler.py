@@ -0,0 +1,131 @@
+# Ordonnanceur d'inférence par micro-lots (micro-batching) pour YOLOv8
+#
+# Les requêtes Flask déposent leur image dans une file ; un thread unique
+# regroupe les images arrivées dans une courte fenêtre (ou jusqu'à N images),
+# exécute un seul passage du modèle sur le lot, puis renvoie à chaque requête
+# son propre résultat. Une image seule dans la file part sans attendre : une
+# caméra unique ne paie jamais la fenêtre, et les images arrivées pendant une
+# inférence forment le lot suivant.
+import threading
+import queue
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class InferenceTimeout(Exception):
+    """Levée quand le résultat n'est pas disponible avant la latence maximale."""
+
+
+class _Request:
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchScheduler:
+    """Regroupe les frames arrivant en même temps en un seul passage du modèle.
+
+    - window_ms : durée pendant laquelle la première frame d'un lot attend les suivantes,
+      quand d'autres frames attendaient déjà (une frame seule part immédiatement)
+    - max_batch : taille maximale d'un lot
+    - max_latency_ms : délai au-delà duquel une requête abandonne (InferenceTimeout)
+    """
+
+    def __init__(self, model, window_ms=20, max_batch=8, max_latency_ms=2000):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._frames = 0
+        self._timeouts = 0
+        self._queue_wait_total = 0.0
+        self._inference_total = 0.0
+        self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """Ajoute une image à la file et retourne un Future contenant le résultat YOLO."""
+        request = _Request(image)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, image):
+        """Équivalent bloquant de model(image)[0], borné par la latence maximale."""
+        future = self.submit(image)
+        try:
+            return future.result(timeout=self.max_latency)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise InferenceTimeout(f"No inference result after {self.max_latency * 1000:.0f} ms")
+
+    def _collect(self):
+        """Attend une première frame puis complète le lot pendant la fenêtre."""
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # Aucune autre frame en attente (et aucun lot en cours : ce thread est le seul
+        # à exécuter le modèle) : pas de fenêtre, la frame part tout de suite
+        deadline = batch[0].enqueued_at + self.window if len(batch) > 1 else 0
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Les requêtes déjà abandonnées par leur appelant sont ignorées
+        return [r for r in batch if r.future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                results = self.model([r.image for r in batch], verbose=False)
+            except Exception as e:
+                print(f"[ERROR] Batched inference failed: {e}")
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            finished = time.monotonic()
+
+            for r, result in zip(batch, results):
+                r.future.set_result(result)
+
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._frames += len(batch)
+                self._queue_wait_total += sum(started - r.enqueued_at for r in batch)
+                self._inference_total += finished - started
+
+    def stats(self):
+        """Métriques de l'ordonnanceur (distribution des tailles de lot, attentes...)."""
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'max_latency_ms': self.max_latency * 1000,
+                'batches': batches,
+                'frames': self._frames,
+                'timeouts': self._timeouts,
+                'queued': self._queue.qsize(),
+                'batch_size_distribution': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'mean_batch_size': self._frames / batches if batches else 0,
+                'mean_queue_wait_ms': self._queue_wait_total / self._frames * 1000 if self._frames else 0,
+                'mean_batch_inference_ms': self._inference_total / batches * 1000 if batches else 0,
+            }
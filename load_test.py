@@ -0,0 +1,350 @@
+# Générateur de charge : plusieurs ESP32-CAM simulés envoyant des images à un serveur
+#
+# Chaque client simulé poste, comme le firmware (test_servers.ino), un
+# formulaire multipart avec un champ imageFile, pris dans un dossier d'images
+# (ou des images synthétiques). Deux modes :
+#   - closed : chaque caméra envoie une image, attend la réponse, puis attend
+#     la prochaine échéance (1 / rate secondes), comme le firmware ;
+#   - open : les envois arrivent au rythme demandé (clients x rate par seconde,
+#     loi de Poisson) sans attendre les réponses. La latence est mesurée depuis
+#     l'heure d'envoi prévue : un serveur saturé apparaît dans les percentiles au
+#     lieu de ralentir silencieusement les envois.
+# Avec --ramp, le test est répété pour un nombre croissant de caméras et le
+# point de saturation (latence p95 au-delà de --slo-ms, erreurs au-delà de
+# --max-error-rate, ou débit obtenu inférieur au débit demandé) est indiqué.
+# --local lance le serveur dans ce processus : aucun matériel n'est nécessaire.
+#
+#   python load_test.py --local yolov8+ssim --clients 8 --rate 1 --duration 30
+#   python load_test.py --url http://192.168.43.218:5020/uploads --ramp 1,2,4,8,16,32 --output load.json
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+import cv2
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+HISTOGRAM_START_MS = 1   # limite haute du premier intervalle de l'histogramme
+HISTOGRAM_GROWTH = 1.5   # rapport entre deux limites successives
+READY_TIMEOUT = 300      # attente maximale (s) des détecteurs du serveur (route /ready)
+BOUNDARY = uuid.uuid4().hex
+
+
+class Target:
+    """Route d'envoi du serveur (ex. http://127.0.0.1:5020/uploads)."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL: {url}")
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.path = (parts.path or '/uploads') + (f"?{parts.query}" if parts.query else '')
+
+    def connection(self, timeout):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=timeout)
+
+    def get(self, path, timeout=5):
+        conn = self.connection(timeout)
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+
+def multipart_body(data, filename):
+    """Corps du formulaire envoyé par l'ESP32 : un seul champ imageFile."""
+    head = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="imageFile"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode()
+    return head + data + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def load_corpus(folder=None, limit=None):
+    """Corps multipart prêts à l'envoi, construits une seule fois (images du dossier ou synthétiques)."""
+    frames = []
+    if folder:
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                if name.lower().endswith(('.jpg', '.jpeg')) and name != 'reference_image.jpg':
+                    with open(os.path.join(root, name), 'rb') as f:
+                        frames.append(multipart_body(f.read(), name))
+                    if limit and len(frames) >= limit:
+                        return frames
+        return frames
+    # Sans dossier : images 640x480 (résolution VGA de l'ESP32-CAM) bruitées, toutes différentes
+    rng = np.random.default_rng(0)
+    for index in range(8):
+        image = np.full((480, 640, 3), 90 + 10 * index, np.uint8)
+        image += rng.integers(0, 20, image.shape, dtype=np.uint8)
+        frames.append(multipart_body(cv2.imencode('.jpg', image)[1].tobytes(), f"synthetic_{index}.jpg"))
+    return frames
+
+
+class Recorder:
+    """Résultats des envois d'une étape : latences, codes HTTP, délais dépassés, erreurs réseau."""
+
+    def __init__(self):
+        self.latencies = []  # secondes, envois réussis (200) seulement
+        self.outcomes = {}   # 'ok', 'http_503', 'timeout', 'connection_error'...
+        self._lock = threading.Lock()
+
+    def record(self, outcome, latency=None):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if outcome == 'ok':
+                self.latencies.append(latency)
+
+    def summary(self, elapsed, offered_rate):
+        total = sum(self.outcomes.values())
+        ok = self.outcomes.get('ok', 0)
+        timeouts = self.outcomes.get('timeout', 0)
+        latencies = np.array(self.latencies) * 1000
+        return {
+            'requests': total,
+            'ok': ok,
+            'outcomes': dict(sorted(self.outcomes.items())),
+            'error_rate': (total - ok - timeouts) / total if total else 0.0,
+            'timeout_rate': timeouts / total if total else 0.0,
+            'offered_rps': round(offered_rate, 3),
+            'throughput_rps': round(ok / elapsed, 3) if elapsed else 0.0,
+            'latency_ms': {
+                **{f"p{p}": round(float(np.percentile(latencies, p)), 2) for p in PERCENTILES},
+                'mean': round(float(latencies.mean()), 2),
+                'max': round(float(latencies.max()), 2),
+            } if len(latencies) else None,
+            'histogram_ms': histogram(latencies),
+        }
+
+
+def histogram(latencies_ms):
+    """Histogramme à intervalles logarithmiques : [(limite haute en ms, nombre d'envois)]."""
+    if not len(latencies_ms):
+        return []
+    bounds = [HISTOGRAM_START_MS]
+    while bounds[-1] < latencies_ms.max():
+        bounds.append(round(bounds[-1] * HISTOGRAM_GROWTH, 1))
+    counts, _ = np.histogram(latencies_ms, bins=[0] + bounds)
+    return [[bound, int(count)] for bound, count in zip(bounds, counts)]
+
+
+def send(target, body, device_id, timeout, recorder, started):
+    """Un envoi ; la latence court depuis `started` (heure prévue en boucle ouverte)."""
+    conn = target.connection(timeout)
+    headers = {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}', 'Content-Length': str(len(body))}
+    if device_id:
+        headers['X-Device-ID'] = device_id
+    try:
+        conn.request('POST', target.path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            recorder.record('ok', time.monotonic() - started)
+        else:
+            recorder.record(f"http_{response.status}")
+    except (socket.timeout, TimeoutError):
+        recorder.record('timeout')
+    except (OSError, http.client.HTTPException):
+        recorder.record('connection_error')
+    finally:
+        conn.close()
+
+
+def sleep_until(deadline):
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def run_closed_loop(target, frames, clients, rate, duration, timeout, device_prefix):
+    """Chaque caméra : envoi, attente de la réponse, puis prochaine échéance (jamais deux envois simultanés)."""
+    recorder = Recorder()
+    interval = 1 / rate
+    start = time.monotonic()
+
+    def camera(index):
+        device_id = f"{device_prefix}{index}" if device_prefix else None
+        next_send = start + index * interval / clients  # caméras décalées, comme des ESP32 allumés à des instants différents
+        frame = index
+        while next_send - start < duration:
+            sleep_until(next_send)
+            send(target, frames[frame % len(frames)], device_id, timeout, recorder, time.monotonic())
+            frame += 1
+            next_send = max(next_send + interval, time.monotonic())
+
+    threads = [threading.Thread(target=camera, args=(index,), daemon=True) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.monotonic() - start, clients * rate)
+
+
+def run_open_loop(target, frames, clients, rate, duration, timeout, device_prefix, max_inflight, seed=0):
+    """Arrivées de Poisson à clients x rate envois/s, indépendantes des réponses du serveur."""
+    recorder = Recorder()
+    total_rate = clients * rate
+    rng = random.Random(seed)
+    start = time.monotonic()
+    scheduled = start
+    index = 0
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        while True:
+            scheduled += rng.expovariate(total_rate)
+            if scheduled - start >= duration:
+                break
+            sleep_until(scheduled)
+            client = index % clients
+            device_id = f"{device_prefix}{client}" if device_prefix else None
+            executor.submit(send, target, frames[index % len(frames)], device_id, timeout, recorder, scheduled)
+            index += 1
+    return recorder.summary(time.monotonic() - start, total_rate)
+
+
+def run_step(args, target, frames, clients):
+    if args.mode == 'open':
+        return run_open_loop(target, frames, clients, args.rate, args.duration, args.timeout,
+                             args.device_prefix, args.max_inflight)
+    return run_closed_loop(target, frames, clients, args.rate, args.duration, args.timeout, args.device_prefix)
+
+
+def saturation(steps, slo_ms, max_error_rate, min_throughput_ratio=0.9):
+    """Plus grand nombre de caméras servies dans les objectifs, et première étape hors objectifs."""
+    within, first_saturated = None, None
+    for step in steps:
+        reasons = []
+        latency = step['latency_ms']
+        if latency is None or latency['p95'] > slo_ms:
+            reasons.append(f"p95 > {slo_ms} ms")
+        if step['error_rate'] + step['timeout_rate'] > max_error_rate:
+            reasons.append(f"errors > {max_error_rate:.0%}")
+        if step['throughput_rps'] < min_throughput_ratio * step['offered_rps']:
+            reasons.append("throughput below offered rate")
+        step['saturated'] = reasons
+        if not reasons and first_saturated is None:
+            within = step['clients']
+        elif reasons and first_saturated is None:
+            first_saturated = step['clients']
+    return {'max_clients_within_slo': within, 'first_saturated_clients': first_saturated,
+            'slo_p95_ms': slo_ms, 'max_error_rate': max_error_rate}
+
+
+def start_local_server(pipeline):
+    """Serveur multi-détecteurs (presence_server.py) lancé dans ce processus, sur un port libre."""
+    from werkzeug.serving import make_server
+    from presence_server import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # pas une ligne de journal par requête
+    server = make_server('127.0.0.1', 0, create_app(pipeline), threaded=True)
+    threading.Thread(target=server.serve_forever, name='local-server', daemon=True).start()
+    print(f"[INFO] Local server for {pipeline} on port {server.server_port}")
+    return f"http://127.0.0.1:{server.server_port}/uploads"
+
+
+def wait_ready(target, timeout=READY_TIMEOUT):
+    """Attend que les détecteurs du serveur soient chargés (sinon les premières images passent par SSIM seul)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status = target.get('/ready')
+        except OSError:
+            status = None
+        if status in (200, 404):  # 404 : serveur sans route /ready
+            return True
+        time.sleep(1)
+    print(f"[WARNING] Server not ready after {timeout} s. Starting anyway.")
+    return False
+
+
+def print_step(step):
+    latency = step['latency_ms'] or {}
+    print(f"[INFO] {step['clients']:>4} client(s): {step['requests']} request(s), "
+          f"{step['throughput_rps']:.2f}/{step['offered_rps']:.2f} rps, "
+          f"p50 {latency.get('p50', '-')} ms, p95 {latency.get('p95', '-')} ms, p99 {latency.get('p99', '-')} ms, "
+          f"errors {step['error_rate']:.1%}, timeouts {step['timeout_rate']:.1%}")
+
+
+def print_histogram(step, width=40):
+    peak = max((count for _, count in step['histogram_ms']), default=0)
+    for bound, count in step['histogram_ms']:
+        if count:
+            print(f"    <= {bound:>9.1f} ms {count:>7} {'#' * max(1, round(width * count / peak))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate ESP32-CAM clients uploading frames to a presence server.")
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument('--url', default='http://127.0.0.1:5020/uploads', help="upload URL of the server")
+    server.add_argument('--local', metavar='PIPELINE',
+                        help="start presence_server.create_app(PIPELINE) in this process and test it")
+    parser.add_argument('--corpus', help="folder of JPEG frames to send (default: synthetic frames)")
+    parser.add_argument('--limit', type=int, help="load at most this many frames from the corpus")
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed', help="closed-loop or open-loop")
+    parser.add_argument('--clients', type=int, default=4, help="simulated cameras")
+    parser.add_argument('--ramp', help="comma-separated client counts tested in turn (e.g. 1,2,4,8,16)")
+    parser.add_argument('--rate', type=float, default=1.0, help="frames per second per camera")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds per step")
+    parser.add_argument('--timeout', type=float, default=10.0, help="request timeout in seconds")
+    parser.add_argument('--max-inflight', type=int, default=256, help="open-loop: concurrent requests at most")
+    parser.add_argument('--device-prefix', default='loadcam',
+                        help="X-Device-ID of each camera is <prefix><index> ('' to send no device id)")
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help="p95 latency objective for the saturation point")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="error + timeout rate objective")
+    parser.add_argument('--no-wait-ready', action='store_true', help="do not wait for GET /ready before starting")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    frames = load_corpus(args.corpus, args.limit)
+    if not frames:
+        parser.error(f"no JPEG found in {args.corpus}")
+    target = Target(start_local_server(args.local) if args.local else args.url)
+    if not args.no_wait_ready:
+        wait_ready(target)
+
+    client_counts = [int(count) for count in args.ramp.split(',')] if args.ramp else [args.clients]
+    print(f"[INFO] {args.mode}-loop test of {target.url}: {len(frames)} frame(s), {args.rate} fps per camera, "
+          f"{args.duration} s per step")
+    steps = []
+    for clients in client_counts:
+        step = {'clients': clients, **run_step(args, target, frames, clients)}
+        steps.append(step)
+        print_step(step)
+        print_histogram(step)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'url': target.url,
+        'mode': args.mode,
+        'rate_per_client': args.rate,
+        'duration': args.duration,
+        'timeout': args.timeout,
+        'frames': len(frames),
+        'steps': steps,
+        'saturation': saturation(steps, args.slo_ms, args.max_error_rate),
+    }
+    result = report['saturation']
+    print(f"[INFO] Cameras served within objectives: {result['max_clients_within_slo']}; "
+          f"first saturated step: {result['first_saturated_clients']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
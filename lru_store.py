@@ -0,0 +1,71 @@
+# Dictionnaire borné (éviction LRU) pour l'état tenu par caméra
+#
+# Un serveur peut recevoir les images de centaines de caméras : l'état propre
+# à chacune (image de référence décodée, dernière frame analysée, présence
+# lissée, suivi des visages...) est gardé en mémoire pour les caméras actives
+# seulement. Au-delà de max_entries, la caméra la moins récemment vue est
+# oubliée ; son état est reconstruit à partir du disque (image de référence,
+# status.txt) quand elle renvoie une image.
+import os
+import threading
+from collections import OrderedDict
+
+# Nombre de caméras dont l'état est gardé en mémoire (par pipeline et par détecteur)
+CAMERA_CACHE_SIZE = int(os.environ.get('CAMERA_CACHE_SIZE', 256))
+
+
+class LRUStore:
+    """Dictionnaire thread-safe d'au plus `max_entries` entrées, la moins récemment utilisée évincée en premier."""
+
+    def __init__(self, max_entries=CAMERA_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, default)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        """Valeur de `key`, créée par factory(key) si elle n'est pas (ou plus) en mémoire."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                value = self._entries[key] = factory(key)
+                self._evict()
+            else:
+                self._entries.move_to_end(key)
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def items(self):
+        """Copie des entrées, de la moins à la plus récemment utilisée (sans les marquer comme utilisées)."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'evictions': self.evictions}
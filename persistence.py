@@ -0,0 +1,148 @@
+# File d'écriture en arrière-plan (images, status.txt, base de données)
+#
+# La réponse à l'ESP32 part dès que la décision de présence est connue : les
+# écritures de chaque frame forment une tâche, exécutée dans l'ordre par un
+# thread dédié. La file est bornée ; quand elle est pleine, la politique
+# on_full décide : attendre (block), écrire dans la requête (inline) ou
+# abandonner la tâche (drop). La politique fsync fixe la durabilité :
+# none (le système écrit quand il veut, le moins d'usure de la carte SD),
+# interval (os.sync() au plus toutes les sync_interval secondes) ou always
+# (fsync de chaque fichier avant de le rendre visible).
+import atexit
+import os
+import queue
+import threading
+import time
+
+FSYNC_POLICIES = ('none', 'interval', 'always')
+FULL_POLICIES = ('block', 'inline', 'drop')
+
+
+class PersistenceQueue:
+    """File bornée de tâches d'écriture, exécutées dans l'ordre par un seul thread."""
+
+    def __init__(self, max_pending=256, fsync='none', on_full='block', sync_interval=5.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        if on_full not in FULL_POLICIES:
+            raise ValueError(f"on_full must be one of {', '.join(FULL_POLICIES)}")
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.on_full = on_full
+        self.sync_interval = sync_interval
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.inline = 0
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_pending) if max_pending > 0 else None
+        if self._queue is not None:
+            threading.Thread(target=self._run, name='persistence', daemon=True).start()
+            atexit.register(self.flush, 10)
+
+    def submit(self, task, *args):
+        """Exécute task(*args) en arrière-plan ; retourne False si la tâche a été abandonnée."""
+        if self._queue is None:
+            self._execute(task, args)  # max_pending = 0 : écritures synchrones
+            return True
+        try:
+            self._queue.put_nowait((task, args))
+            return True
+        except queue.Full:
+            pass
+        if self.on_full == 'block':
+            self._queue.put((task, args))
+            return True
+        if self.on_full == 'inline':
+            self.inline += 1
+            self._execute(task, args)
+            return True
+        self.dropped += 1
+        print(f"[WARNING] Persistence queue full ({self.max_pending}). Dropping {getattr(task, '__name__', task)}.")
+        return False
+
+    def write_file(self, path, data):
+        """Écrit le fichier via un fichier temporaire puis os.replace : jamais de fichier partiel visible."""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            f = open(tmp_path, 'wb')
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)  # dossier supprimé entre-temps (rétention)
+            f = open(tmp_path, 'wb')
+        with f:
+            f.write(data)
+            if self.fsync == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync == 'always':
+            self._fsync_dir(os.path.dirname(path) or '.')
+        self._dirty = True
+
+    @staticmethod
+    def _fsync_dir(directory):
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return  # non supporté (Windows)
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _execute(self, task, args):
+        try:
+            task(*args)
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"[ERROR] Persistence task {getattr(task, '__name__', task)} failed: {e}")
+
+    def _sync_if_due(self):
+        if self.fsync == 'interval' and self._dirty and time.monotonic() - self._last_sync >= self.sync_interval:
+            self._sync_all()
+
+    def _sync_all(self):
+        if hasattr(os, 'sync'):  # absent sous Windows
+            os.sync()
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _run(self):
+        while True:
+            try:
+                task, args = self._queue.get(timeout=self.sync_interval)
+            except queue.Empty:
+                self._sync_if_due()
+                continue
+            try:
+                self._execute(task, args)
+                self._sync_if_due()
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """Attend que toutes les tâches en file soient exécutées (arrêt du serveur)."""
+        if self._queue is None:
+            return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        finished = done.wait(timeout)
+        if self.fsync == 'interval' and self._dirty:
+            self._sync_all()
+        return finished
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'max_pending': self.max_pending,
+            'fsync': self.fsync,
+            'on_full': self.on_full,
+            'completed': self.completed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'inline': self.inline,
+        }
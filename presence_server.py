@@ -0,0 +1,654 @@
+# Serveur de détection de présence multi-détecteurs (un seul processus)
+#
+# Toutes les méthodes (haar, yolov8, yolov3, ssim, mediapipe) partagent le même
+# chemin de réception, de sauvegarde et de journalisation. Le détecteur se
+# choisit par route (POST /uploads/<pipeline>) ou par requête
+# (POST /uploads?detector=<pipeline> ou champ de formulaire "detector").
+# Chaque modèle n'est chargé qu'une seule fois (voir detectors.py), en
+# arrière-plan : le serveur HTTP répond immédiatement, /ready indique l'état de
+# chaque détecteur et les images reçues avant qu'il soit prêt passent par un
+# chemin dégradé (SSIM seul).
+from flask import Flask, request, jsonify
+from datetime import datetime
+import atexit
+import multiprocessing
+import os
+import re
+import struct
+import threading
+from db_logger import existing_logger, get_logger
+from frame_store import FrameStore
+from frame_utils import Frame
+from lru_store import LRUStore
+from ssim_engine import MotionGate
+from inference_scheduler import InferenceTimeout
+from persistence import PersistenceQueue
+from presence_status import DEFAULT_DEVICE, PresenceStateMachine, status_board
+from detectors import DETECTORS, get_detector, loaded_detectors, preload, readiness
+from worker_pool import DetectorPool, PoolOverloaded, WorkerCrashed
+
+DATABASE_FILE = 'presence.db'
+
+# Mode « gate-first » : un pré-filtre de mouvement décide si le détecteur doit être lancé
+GATE_FIRST = os.environ.get('GATE_FIRST', '0') == '1'
+
+# Attente maximale (ms) d'un détecteur encore en chargement avant de passer au chemin SSIM seul
+READY_WAIT_MS = float(os.environ.get('READY_WAIT_MS', 0))
+
+# Détecteurs supplémentaires à charger dès le démarrage (ex. "yolov3,haar")
+PRELOAD_DETECTORS = [name for name in os.environ.get('PRELOAD_DETECTORS', '').split(',') if name]
+
+# Pool de processus de détection : WORKER_PROCESSES répliques par détecteur lourd
+# (0 = détection dans le processus Flask), file bornée à WORKER_QUEUE_SIZE frames
+WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', 0))
+WORKER_QUEUE_SIZE = int(os.environ.get('WORKER_QUEUE_SIZE', 2 * WORKER_PROCESSES))
+WORKER_TIMEOUT_MS = float(os.environ.get('WORKER_TIMEOUT_MS', 5000))
+POOLED_DETECTORS = os.environ.get('POOLED_DETECTORS', 'yolov8,yolov3,haar,mediapipe').split(',')
+
+# État de présence : toujours en mémoire (route /status) ; STATUS_FILE=1 tient aussi à jour
+# status.txt dans le dossier du pipeline (réécrit atomiquement à chaque changement)
+STATUS_FILE = os.environ.get('STATUS_FILE', '1') == '1'
+STATUS_MAX_WAIT = float(os.environ.get('STATUS_MAX_WAIT', 60))  # attente maximale d'un long-poll (s)
+
+# Stockage des images : "content" (AAAA/MM/JJ/<empreinte>_presence_X.jpg, images vides
+# quasi identiques stockées une seule fois) ou "legacy" (capture_<méthode>_<horodatage>_presence_X.jpg)
+FRAME_STORE = os.environ.get('FRAME_STORE', 'content')
+DEDUPE_DISTANCE = int(os.environ.get('DEDUPE_DISTANCE', 4))  # -1 : pas de déduplication
+
+# Écritures (image, status.txt, base) en arrière-plan, après la réponse : file de
+# PERSIST_QUEUE_SIZE frames (0 = écritures synchrones), politique fsync "none", "interval"
+# ou "always", et comportement quand la file est pleine : "block", "inline" ou "drop"
+persistence_queue = PersistenceQueue(
+    max_pending=int(os.environ.get('PERSIST_QUEUE_SIZE', 256)),
+    fsync=os.environ.get('PERSIST_FSYNC', 'none'),
+    on_full=os.environ.get('PERSIST_ON_FULL', 'block'),
+    sync_interval=float(os.environ.get('PERSIST_SYNC_INTERVAL', 5)),
+)
+
+# Routes brutes (application/octet-stream) : taille maximale d'une image et d'un lot
+MAX_FRAME_BYTES = int(os.environ.get('MAX_FRAME_BYTES', 4 * 1024 * 1024))
+MAX_BATCH_FRAMES = int(os.environ.get('MAX_BATCH_FRAMES', 32))
+
+# En-tête de chaque frame d'un lot binaire : horodatage de capture (ms depuis l'epoch,
+# 0 = inconnu) sur 8 octets puis longueur du JPEG sur 4 octets, en big-endian
+BATCH_HEADER = struct.Struct('>QI')
+
+# Cadence adaptative : présence lissée par caméra (hystérésis, voir presence_status.py). Une
+# présence trouvée par le détecteur principal est ensuite confirmée par une vérification rapide
+# (CONFIRM_CHECK : "diff" = différence avec la dernière frame analysée, "ssim" = changement par
+# rapport à l'image de référence, "haar" = visage), le détecteur n'étant relancé que toutes les
+# CONFIRM_EVERY frames ou quand la vérification n'est pas concluante
+ADAPTIVE_CADENCE = os.environ.get('ADAPTIVE_CADENCE', '0') == '1'
+CONFIRM_CHECK = os.environ.get('CONFIRM_CHECK', 'diff')
+CONFIRM_EVERY = int(os.environ.get('CONFIRM_EVERY', 10))
+PRESENT_AFTER = int(os.environ.get('PRESENT_AFTER', 1))  # observations consécutives avant de passer à « présent »
+ABSENT_AFTER = int(os.environ.get('ABSENT_AFTER', 3))    # ... et avant de repasser à « absent »
+
+# Plusieurs caméras par serveur : identifiant envoyé dans l'en-tête X-Device-ID (ou le champ
+# « device » du formulaire, ou ?device=). Chaque caméra a son dossier (<dossier du pipeline>/devices/<id>),
+# son image de référence, son status.txt et sa séquence de try_id. La caméra sans identifiant
+# garde les emplacements historiques. L'état en mémoire est limité aux CAMERA_CACHE_SIZE
+# caméras les plus récentes (voir lru_store.py)
+DEVICE_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+DEVICES_FOLDER = 'devices'
+
+# Rétention en arrière-plan (voir clean_directories.py pour les quotas d'âge et de taille)
+RETENTION = os.environ.get('RETENTION', '0') == '1'
+
+
+class CameraState:
+    """État d'une caméra dans un pipeline : emplacements, référence, frames récentes et présence.
+
+    Reconstruit à partir du disque quand la caméra revient après avoir été évincée
+    de la mémoire : l'image de référence est relue au besoin et la présence lissée
+    reprend la dernière valeur de status.txt.
+    """
+
+    def __init__(self, pipeline, device_id=DEFAULT_DEVICE):
+        self.device_id = device_id
+        # Préfixe des chemins (relatifs au dossier du pipeline) de cette caméra, '' pour la caméra historique
+        self.prefix = '' if device_id == DEFAULT_DEVICE else f"{DEVICES_FOLDER}/{device_id}/"
+        self.upload_folder = os.path.join(pipeline.upload_folder, *self.prefix.split('/'))
+        self.fallback_folder = os.path.join(pipeline.fallback_folder, *self.prefix.split('/'))
+        self.reference_path = os.path.join(self.upload_folder, 'reference_image.jpg')
+        self.status_file = os.path.join(self.upload_folder, 'status.txt')
+        self.counter = pipeline.method if device_id == DEFAULT_DEVICE else f"{pipeline.method}@{device_id}"
+        self.motion_gate = MotionGate()
+        self.presence_state = PresenceStateMachine(PRESENT_AFTER, ABSENT_AFTER, CONFIRM_EVERY)
+        self.frame_store = FrameStore(pipeline.upload_folder, dedupe_distance=DEDUPE_DISTANCE, prefix=self.prefix)
+        self.fallback_store = FrameStore(pipeline.fallback_folder, dedupe_distance=DEDUPE_DISTANCE,
+                                         prefix=self.prefix)
+        self._folders = [self.upload_folder] + ([self.fallback_folder] if pipeline.fallback else [])
+        self._folders_ready = False
+        self.status_dirty = False  # status.txt en retard sur l'état en mémoire (écriture abandonnée ou échouée)
+        try:
+            with open(self.status_file) as f:
+                self.presence_state.present = f.read().strip() == '1'
+        except OSError:
+            pass
+
+    def ensure_folders(self):
+        if not self._folders_ready:
+            for folder in self._folders:
+                os.makedirs(folder, exist_ok=True)
+            self._folders_ready = True
+
+    @property
+    def db_device_id(self):
+        """Valeur de presence_logs.device_id (NULL pour la caméra historique)."""
+        return None if self.device_id == DEFAULT_DEVICE else self.device_id
+
+
+class Pipeline:
+    """Chaîne de détection : détecteur principal, secours éventuel et dossier de stockage."""
+
+    def __init__(self, name, method, detector, fallback=None, upload_folder=None, file_tag=None,
+                 fallback_tag=None, save_absent=True, log_to_db=True, detector_options=None):
+        self.name = name
+        self.method = method                  # valeur de presence_logs.method
+        self.detector = detector              # nom du détecteur principal
+        self.fallback = fallback              # nom du détecteur de secours (ou None)
+        self.upload_folder = upload_folder or f"uploads_{name.replace('+', '_')}"
+        self.fallback_folder = os.path.join(self.upload_folder, 'fallback_images')
+        self.reference_path = os.path.join(self.upload_folder, 'reference_image.jpg')  # caméra historique
+        self.file_tag = file_tag or method
+        self.fallback_tag = fallback_tag or self.file_tag
+        self.save_absent = save_absent        # sauvegarder aussi les images sans présence
+        self.log_to_db = log_to_db
+        self.detector_options = detector_options or {}
+        self._cameras = LRUStore()
+
+    def camera(self, device_id=DEFAULT_DEVICE):
+        """État de la caméra, recréé s'il a été évincé de la mémoire."""
+        return self._cameras.get_or_create(device_id, lambda key: CameraState(self, key))
+
+    def method_names(self):
+        """Méthodes partageant la séquence de try_id de ce pipeline."""
+        return [self.method, f"Fallback ({self.method})", f"Skipped ({self.method})",
+                f"SSIM-only ({self.method})", f"Confirmed ({self.method})"]
+
+    def detectors(self):
+        return [self.detector] + ([self.fallback] if self.fallback else [])
+
+
+# Pipelines historiques (mêmes méthodes et dossiers que les anciens serveurs séparés)
+PIPELINES = {
+    'cv2': Pipeline('cv2', 'cv2', 'haar', upload_folder='uploads_cv2', file_tag='CV2'),
+    'yolov8': Pipeline('yolov8', 'YOLOv8', 'yolov8', upload_folder='uploads_yolov8',
+                       detector_options={'confidence_threshold': 0}),
+    'yolov3+ssim': Pipeline('yolov3+ssim', 'YOLO3+SSIM', 'yolov3', fallback='ssim',
+                            upload_folder='uploads_yolov3_ssim', fallback_tag='YOLO3', save_absent=False),
+    'yolov8+ssim': Pipeline('yolov8+ssim', 'YOLO8+SSIM', 'yolov8', fallback='ssim',
+                            upload_folder='uploads_yolov8_ssim', fallback_tag='YOLO8'),
+    'ssim': Pipeline('ssim', 'SSIM', 'ssim', upload_folder='uploads_ssim'),
+    'mediapipe': Pipeline('mediapipe', 'MediaPipe', 'mediapipe', upload_folder='uploads_mediapipe',
+                          log_to_db=False),
+}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name):
+    """Pool de processus du détecteur, créé (et ses processus démarrés) au premier appel."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            if name not in DETECTORS:
+                raise KeyError(f"Unknown detector: {name}")
+            pool = _pools[name] = DetectorPool(name, workers=WORKER_PROCESSES, queue_size=WORKER_QUEUE_SIZE,
+                                               timeout_ms=WORKER_TIMEOUT_MS)
+        return pool
+
+
+def uses_pool(name):
+    return WORKER_PROCESSES > 0 and name in POOLED_DETECTORS
+
+
+def resolve_detector(name, timeout):
+    """Détecteur (ou pool de processus) prêt à l'emploi, ou None s'il n'est pas prêt à temps."""
+    if uses_pool(name):
+        pool = get_pool(name)
+        return pool if pool.wait_ready(timeout) else None
+    return get_detector(name, timeout=timeout)
+
+
+def get_pipeline(name):
+    """Pipeline nommé, ou pipeline construit à la volée pour « <détecteur> » ou « <détecteur>+ssim »."""
+    pipeline = PIPELINES.get(name)
+    if pipeline is None:
+        base, _, fallback = name.partition('+')
+        if base not in DETECTORS or fallback not in ('', 'ssim'):
+            raise KeyError(f"Unknown detector: {name}")
+        pipeline = PIPELINES[name] = Pipeline(name, name, base, fallback=fallback or None)
+    return pipeline
+
+
+def parse_device_id(value):
+    """Identifiant de caméra envoyé par le client (DEFAULT_DEVICE s'il est absent) ; ValueError s'il est invalide."""
+    if not value:
+        return DEFAULT_DEVICE
+    if not DEVICE_ID_PATTERN.fullmatch(value):
+        raise ValueError(value)
+    return value
+
+
+def confirm_presence(camera, frame):
+    """Vérification rapide d'une présence déjà établie par le détecteur : True si elle est confirmée."""
+    if CONFIRM_CHECK == 'diff':
+        # Scène inchangée depuis la dernière frame analysée (où le détecteur a vu quelqu'un)
+        return camera.motion_gate.check(frame) is True
+    return bool(get_detector(CONFIRM_CHECK).detect(frame, camera))
+
+
+def process_frame(pipeline, frame, captured_at=None, device_id=DEFAULT_DEVICE):
+    """Chemin commun : détection, secours éventuel, sauvegarde, statut et base de données.
+
+    `captured_at` : heure de capture (datetime) d'une frame envoyée en différé, sinon l'heure de réception.
+    Les détecteurs reçoivent l'état de la caméra (`CameraState`) comme contexte.
+    """
+    camera = pipeline.camera(device_id)
+    camera.ensure_folders()
+    # Détecteur pas encore prêt (chargement en cours ou en échec) : None
+    detector = resolve_detector(pipeline.detector, READY_WAIT_MS / 1000)
+    tag = detector.method_tag if detector is not None else ''
+    fallback_used = 0
+    inferred, confident = detector is None, False
+
+    # Cadence adaptative : présence sûre et récente, une vérification rapide remplace le détecteur
+    confirmed = ADAPTIVE_CADENCE and detector is not None and not camera.presence_state.needs_inference() \
+        and confirm_presence(camera, frame)
+    # En mode gate-first, une scène inchangée réutilise la décision précédente
+    gated_presence = camera.motion_gate.check(frame) if GATE_FIRST and detector is not None and not confirmed \
+        else None
+    if confirmed:
+        presence = True
+        method = f"Confirmed ({pipeline.method})" + tag
+        print(f"[INFO] Presence confirmed by {CONFIRM_CHECK} check. Skipping {pipeline.detector}.")
+    elif detector is None:
+        # Chemin dégradé pendant le chargement du modèle : comparaison SSIM seule
+        presence = bool(get_detector('ssim').detect(frame, camera))
+        method = f"SSIM-only ({pipeline.method})"
+        print(f"[WARNING] Detector {pipeline.detector} not ready. Using SSIM only.")
+    elif gated_presence is not None:
+        presence = gated_presence
+        method = f"Skipped ({pipeline.method})" + tag
+        print("[INFO] No motion since last analysed frame. Reusing previous decision.")
+    else:
+        presence = bool(detector.detect(frame, camera, **pipeline.detector_options))
+        method = pipeline.method + tag
+        inferred, confident = True, presence
+
+        # Si le détecteur principal échoue, utiliser la méthode de secours
+        if not presence and pipeline.fallback:
+            if get_detector(pipeline.fallback).detect(frame, camera):
+                print(f"[WARNING] {pipeline.detector} missed it. {pipeline.fallback} detected presence.")
+                presence = True
+                fallback_used = 1
+                method = f"Fallback ({pipeline.method})" + tag
+
+        if GATE_FIRST or (ADAPTIVE_CADENCE and CONFIRM_CHECK == 'diff'):
+            camera.motion_gate.update(frame, presence)
+
+    detected = presence
+    if ADAPTIVE_CADENCE:
+        # Réponse, statut, image et base de données portent la présence lissée
+        presence = camera.presence_state.observe(presence, confident, inferred)
+        if presence != detected:
+            print(f"[INFO] Smoothed presence: {int(presence)} (frame: {int(detected)}).")
+
+    presence_flag = 1 if presence else 0
+    now = captured_at or datetime.now()
+    file_timestamp = now.strftime('%Y%m%d_%H%M%S')
+
+    # Emplacement de l'image (None : rien à écrire) ; les octets JPEG d'origine sont écrits une seule fois
+    store, image_path = None, None
+    if FRAME_STORE == 'content':
+        # Chemin relatif au dossier du pipeline (ou au dossier des images de secours)
+        store = camera.fallback_store if fallback_used else camera.frame_store
+        if presence or pipeline.save_absent:
+            filename, image_path = store.store(frame, presence_flag, now)
+        else:
+            filename = store.relative_path(frame, presence_flag, now)
+    elif fallback_used:
+        filename = f"{camera.prefix}fallback_{pipeline.fallback_tag}_{file_timestamp}_presence_1.jpg"
+        image_path = os.path.join(pipeline.fallback_folder, *filename.split('/'))
+    else:
+        filename = f"{camera.prefix}capture_{pipeline.file_tag}_{file_timestamp}_presence_{presence_flag}.jpg"
+        if presence or pipeline.save_absent:
+            image_path = os.path.join(pipeline.upload_folder, *filename.split('/'))
+    print(f"[INFO] {filename} ({method})")
+
+    # L'état en mémoire est à jour tout de suite ; status.txt n'est réécrit que s'il change
+    # (ou si sa dernière écriture n'a pas eu lieu)
+    changed = status_board.update(pipeline.name, presence_flag, method, filename, device_id)
+    status_path = camera.status_file if STATUS_FILE and (changed or camera.status_dirty) else None
+    camera.status_dirty = False
+
+    # Écritures sur le disque après la réponse, dans l'ordre image, status.txt, base de données
+    timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+    submitted = persistence_queue.submit(persist_frame, pipeline, camera, frame.data, store, image_path,
+                                         status_path, presence_flag, filename, fallback_used, method, timestamp)
+    if not submitted and image_path is not None and store is not None:
+        store.written(image_path)
+    if not submitted and status_path is not None:
+        # Tâche abandonnée (PERSIST_ON_FULL=drop) : status.txt sera réécrit à la prochaine frame
+        camera.status_dirty = True
+
+    return {'device_id': device_id, 'presence': presence_flag, 'detected': 1 if detected else 0, 'fallback_used': fallback_used,
+            'method': method, 'filename': filename, 'timestamp': timestamp}
+
+
+def persist_frame(pipeline, camera, data, store, image_path, status_path, presence_flag, filename, fallback_used,
+                  method, timestamp):
+    """Tâche de la file de persistance : image, puis status.txt, puis ligne de presence_logs."""
+    if image_path is not None:
+        try:
+            persistence_queue.write_file(image_path, data)
+        except Exception as e:
+            print(f"[ERROR] Failed to save {image_path}: {e}")
+        finally:
+            if store is not None:
+                store.written(image_path)
+    if status_path is not None:
+        try:
+            persistence_queue.write_file(status_path, str(presence_flag).encode())
+        except Exception as e:
+            camera.status_dirty = True
+            print(f"[ERROR] Failed to write status: {e}")
+    if pipeline.log_to_db:
+        save_to_db(pipeline, filename, presence_flag, fallback_used, method, timestamp, camera)
+
+
+def flush_on_exit():
+    """À l'arrêt : vider la file d'écriture, puis les lignes qu'elle a confiées à db_logger.
+
+    Un pipeline sans base de données (mediapipe) n'a jamais créé d'écrivain : rien n'est ouvert.
+    """
+    persistence_queue.flush(10)
+    logger = existing_logger()
+    if logger is not None:
+        logger.flush(5)
+
+
+def parse_capture_time(value):
+    """Heure de capture envoyée par la caméra : millisecondes depuis l'epoch ou 'AAAA-MM-JJ HH:MM:SS'."""
+    if value in (None, '', '0', 0):
+        return None
+    if isinstance(value, int) or value.isdigit():
+        try:
+            return datetime.fromtimestamp(int(value) / 1000)
+        except (OverflowError, OSError) as e:  # horodatage hors de la plage de la plateforme
+            raise ValueError(f"Capture time out of range: {value}") from e
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+
+class BatchFormatError(Exception):
+    """Lot binaire illisible au-delà d'une frame : (message, code HTTP)."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def read_exactly(stream, length):
+    """Lit `length` octets du flux de la requête (moins si le corps est tronqué)."""
+    chunks = []
+    while length > 0:
+        chunk = stream.read(length)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+def save_to_db(pipeline, filename, presence, fallback_used, method, timestamp, camera=None):
+    """Met la ligne en file pour l'écrivain de db_logger (try_id attribué à l'écriture).
+
+    Toutes les méthodes du pipeline (y compris les variantes suffixées, ex.
+    « YOLO3+SSIM [320-opencv-cpu] ») partagent la séquence de try_id du pipeline,
+    une séquence par caméra.
+    """
+    camera = camera or pipeline.camera()
+    get_logger(DATABASE_FILE).log(filename, presence, fallback_used, method, timestamp,
+                                  counter=camera.counter, counter_methods=pipeline.method_names(),
+                                  device_id=camera.db_device_id)
+
+
+def create_app(default_pipeline, title="ESP32 Multi-Detector Presence Detection Server"):
+    """Application Flask servant les pipelines ; `default_pipeline` répond sur POST /uploads.
+
+    Les détecteurs du pipeline par défaut (et ceux de PRELOAD_DETECTORS) sont
+    chargés et préchauffés en arrière-plan dès la création de l'application.
+    """
+    app = Flask(__name__)
+    expected = get_pipeline(default_pipeline).detectors() + PRELOAD_DETECTORS
+    # Un processus de travail du pool réimporte le module principal : pas de préchargement dans ce cas
+    if multiprocessing.parent_process() is None:
+        preload([name for name in expected if not uses_pool(name)])
+        for name in expected:
+            if uses_pool(name):
+                get_pool(name)
+        if RETENTION:
+            from clean_directories import RetentionDaemon, pipeline_targets
+            RetentionDaemon(pipeline_targets(PIPELINES.values()), DATABASE_FILE).start()
+        atexit.register(flush_on_exit)
+
+    @app.route('/')
+    def index():
+        return f"<h2>{title}</h2>", 200
+
+    # État de chargement de chaque détecteur ; 503 tant que ceux attendus ne sont pas prêts
+    @app.route('/ready')
+    def ready():
+        detectors = readiness()
+        with _pools_lock:
+            pools = {name: pool.describe() for name, pool in _pools.items()}
+        is_ready = all((pools if uses_pool(name) else detectors).get(name, {}).get('state') == 'ready'
+                       for name in expected)
+        return jsonify({'ready': is_ready, 'detectors': detectors, 'pools': pools}), (200 if is_ready else 503)
+
+    @app.route('/uploads', methods=['POST'])
+    @app.route('/uploads/<pipeline_name>', methods=['POST'])
+    def upload_file(pipeline_name=None):
+        if 'imageFile' not in request.files:
+            return "No file part", 400
+
+        file = request.files['imageFile']
+        if file.filename == '':
+            return "No selected file", 400
+
+        device_id = select_device(form=True)
+        if device_id is None:
+            return "Invalid device id", 400
+        try:
+            pipeline = select_pipeline(pipeline_name, form=True)
+            captured_at = parse_capture_time(request.form.get('timestamp'))
+        except KeyError as e:
+            return e.args[0], 404
+        except ValueError:
+            return "Invalid timestamp", 400
+
+        return respond(pipeline, file.read(), captured_at, device_id)
+
+    # Image JPEG brute dans le corps de la requête (Content-Type: application/octet-stream),
+    # lue directement dans le flux, sans analyse de formulaire multipart
+    @app.route('/uploads/raw', methods=['POST'])
+    @app.route('/uploads/raw/<pipeline_name>', methods=['POST'])
+    def upload_raw(pipeline_name=None):
+        length = request.content_length
+        if not length:
+            return "Missing Content-Length", 411
+        if length > MAX_FRAME_BYTES:
+            return "Image too large", 413
+        device_id = select_device()
+        if device_id is None:
+            return "Invalid device id", 400
+        try:
+            pipeline = select_pipeline(pipeline_name)
+            captured_at = parse_capture_time(request.headers.get('X-Capture-Time'))
+        except KeyError as e:
+            return e.args[0], 404
+        except ValueError:
+            return "Invalid X-Capture-Time", 400
+
+        return respond(pipeline, read_exactly(request.stream, length), captured_at, device_id)
+
+    # Plusieurs frames horodatées en une requête (ex. frames gardées par la caméra pendant une
+    # coupure Wi-Fi), traitées dans l'ordre. Corps binaire : suite de [BATCH_HEADER][JPEG], ou
+    # multipart : champs imageFile répétés avec, dans le même ordre, des champs timestamp
+    @app.route('/uploads/batch', methods=['POST'])
+    @app.route('/uploads/batch/<pipeline_name>', methods=['POST'])
+    def upload_batch(pipeline_name=None):
+        multipart = request.mimetype == 'multipart/form-data'
+        if not request.content_length:
+            return "Missing Content-Length", 411
+        if request.content_length > MAX_BATCH_FRAMES * (MAX_FRAME_BYTES + BATCH_HEADER.size):
+            return "Batch too large", 413
+        device_id = select_device(form=multipart)
+        if device_id is None:
+            return "Invalid device id", 400
+        try:
+            pipeline = select_pipeline(pipeline_name, form=multipart)
+        except KeyError as e:
+            return e.args[0], 404
+
+        results = []
+        frames = enumerate(batch_frames(multipart))
+        while True:
+            try:
+                index, (data, timestamp) = next(frames)
+            except StopIteration:
+                break
+            except BatchFormatError as e:
+                # Les frames suivantes ne peuvent pas être délimitées : le lot est refusé à partir de celle-ci
+                return jsonify({'error': str(e), 'results': results}), e.status
+            if index >= MAX_BATCH_FRAMES:
+                return jsonify({'error': f"At most {MAX_BATCH_FRAMES} frames per batch", 'results': results}), 413
+            try:
+                captured_at = parse_capture_time(timestamp)
+            except ValueError:
+                results.append({'index': index, 'error': "Invalid timestamp"})
+                continue
+            result = decide(pipeline, data, captured_at, device_id)
+            if isinstance(result, dict):
+                results.append({'index': index, 'timestamp': result['timestamp'], 'presence': result['presence'],
+                                'fallback_used': result['fallback_used'], 'method': result['method']})
+            else:
+                results.append({'index': index, 'error': result[0]})
+        return jsonify({'results': results})
+
+    def batch_frames(multipart):
+        """(octets JPEG, horodatage) de chaque frame du lot, lues au fur et à mesure.
+
+        BatchFormatError si une frame dépasse MAX_FRAME_BYTES ou si le corps binaire est tronqué.
+        """
+        if multipart:
+            timestamps = request.form.getlist('timestamp')
+            for index, file in enumerate(request.files.getlist('imageFile')):
+                data = file.read()
+                if len(data) > MAX_FRAME_BYTES:
+                    raise BatchFormatError(f"Frame {index} too large", 413)
+                yield data, timestamps[index] if index < len(timestamps) else None
+            return
+        index = 0
+        while True:
+            header = read_exactly(request.stream, BATCH_HEADER.size)
+            if not header:
+                return
+            if len(header) < BATCH_HEADER.size:
+                raise BatchFormatError(f"Truncated header for frame {index}", 400)
+            timestamp, length = BATCH_HEADER.unpack(header)
+            if length > MAX_FRAME_BYTES:
+                raise BatchFormatError(f"Frame {index} too large", 413)
+            yield read_exactly(request.stream, length), timestamp
+            index += 1
+
+    def select_pipeline(pipeline_name, form=False):
+        name = pipeline_name or request.args.get('detector') or (request.form.get('detector') if form else None) \
+            or default_pipeline
+        # « + » non encodé dans l'URL arrive sous forme d'espace (ex. ?detector=haar+ssim)
+        return get_pipeline(name.replace(' ', '+'))
+
+    def select_device(form=False):
+        """Caméra émettrice : en-tête X-Device-ID, ?device= ou champ « device » ; None si l'identifiant est invalide."""
+        value = request.headers.get('X-Device-ID') or request.args.get('device') \
+            or (request.form.get('device') if form else None)
+        try:
+            return parse_device_id(value)
+        except ValueError:
+            return None
+
+    def decide(pipeline, data, captured_at=None, device_id=DEFAULT_DEVICE):
+        """Décision pour les octets JPEG d'une frame : dict de process_frame,
+        ou (message, code HTTP[, en-têtes]) en cas d'erreur."""
+        try:
+            # Décodage unique de l'image reçue (aucune écriture temporaire sur le disque)
+            frame = Frame(data) if data else None
+            if frame is None or not frame.valid:
+                return "Invalid image", 400
+            return process_frame(pipeline, frame, captured_at, device_id)
+
+        except PoolOverloaded as e:
+            print(f"[WARNING] {e}")
+            return "Server overloaded", 503, {'Retry-After': str(e.retry_after)}
+
+        except (InferenceTimeout, WorkerCrashed) as e:
+            print(f"[ERROR] {e}")
+            return "Server busy", 503
+
+        except Exception as e:
+            print(f"[ERROR] {e}")
+            return "Error processing image", 500
+
+    def respond(pipeline, data, captured_at=None, device_id=DEFAULT_DEVICE):
+        result = decide(pipeline, data, captured_at, device_id)
+        if isinstance(result, dict):
+            return ("Presence Detected" if result['presence'] else "No Presence Detected"), 200
+        return result
+
+    # État de présence courant, par pipeline et par caméra.
+    # ?wait=<s> avec If-None-Match (ou ?since=<version>) : attend le prochain changement (long-poll)
+    @app.route('/status')
+    def status():
+        pipeline_name = request.args.get('pipeline')
+        if pipeline_name:
+            pipeline_name = pipeline_name.replace(' ', '+')
+        device_id = request.args.get('device')
+        known = request.args.get('since', type=int)
+        if known is None and request.if_none_match:
+            known = next((int(tag) for tag in request.if_none_match.as_set() if tag.isdigit()), None)
+
+        wait = min(request.args.get('wait', 0, type=float), STATUS_MAX_WAIT)
+        if known is not None and wait > 0:
+            status_board.wait(known, wait, pipeline_name, device_id)
+
+        version, states = status_board.snapshot(pipeline_name, device_id)
+        etag = str(version)
+        if etag in request.if_none_match:
+            return "", 304, {'ETag': f'"{etag}"'}
+        response = jsonify({'version': version, 'states': states})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # File d'écriture en arrière-plan (taille, tâches abandonnées ou exécutées dans la requête)
+    @app.route('/metrics/persistence')
+    def persistence_metrics():
+        return jsonify(persistence_queue.stats())
+
+    # Métriques de l'ordonnanceur YOLOv8 (distribution des tailles de lot)
+    @app.route('/metrics/batching')
+    def batching_metrics():
+        detector = loaded_detectors().get('yolov8')
+        return jsonify(detector.scheduler.stats() if detector is not None and detector.ready else {})
+
+    return app
+
+
+# Lancement du serveur unique : toutes les méthodes sur un seul port
+if __name__ == '__main__':
+    app = create_app(os.environ.get('DEFAULT_PIPELINE', 'yolov8+ssim'))
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5020)))
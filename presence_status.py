@@ -0,0 +1,114 @@
+# État de présence courant, tenu en mémoire par le serveur
+#
+# Un état par pipeline et par caméra (dernière décision, méthode, image,
+# heure du dernier changement). Chaque changement de présence incrémente un
+# numéro de version : c'est l'ETag de la route /status, et un client peut
+# attendre le prochain changement (long-poll) au lieu de relire un fichier en
+# boucle. L'ancien fichier status.txt reste disponible comme sortie optionnelle :
+# update() indique si la présence a changé, et l'appelant ne réécrit le fichier
+# (de façon atomique, voir persistence.py) que dans ce cas. Comme le reste de
+# l'état par caméra, les états d'un pipeline sont bornés (LRUStore) : une caméra
+# qui ne poste plus finit par disparaître de /status.
+#
+# PresenceStateMachine lisse la décision d'une caméra (hystérésis) et décide
+# quand le détecteur complet doit être relancé (cadence adaptative).
+import threading
+import time
+from lru_store import CAMERA_CACHE_SIZE, LRUStore
+
+DEFAULT_DEVICE = 'default'  # caméra unique (requêtes sans identifiant de caméra)
+
+
+class StatusBoard:
+    """États de présence de tous les pipelines et caméras du processus."""
+
+    def __init__(self, max_devices=CAMERA_CACHE_SIZE):
+        self.version = 0
+        self.max_devices = max_devices  # caméras gardées par pipeline
+        self._states = {}  # pipeline -> LRUStore(caméra -> dict)
+        self._changed = threading.Condition()
+
+    def update(self, pipeline, presence, method, filename, device_id=DEFAULT_DEVICE):
+        """Enregistre la décision d'une frame ; retourne True si la présence a changé."""
+        now = time.time()
+        with self._changed:
+            devices = self._states.get(pipeline)
+            if devices is None:
+                devices = self._states[pipeline] = LRUStore(self.max_devices)
+            state = devices.get(device_id)
+            changed = state is None or state['presence'] != presence
+            if changed:
+                self.version += 1
+                state = {'presence': presence, 'since': now, 'version': self.version}
+                devices.put(device_id, state)
+                self._changed.notify_all()
+            state.update(method=method, filename=filename, last_seen=now)
+        return changed
+
+    def _select(self, pipeline, device_id):
+        """[(pipeline, caméra, état)] correspondant aux filtres."""
+        return [(name, device, state)
+                for name, devices in self._states.items() if pipeline is None or name == pipeline
+                for device, state in devices.items() if device_id is None or device == device_id]
+
+    def _version(self, pipeline, device_id):
+        return max((state['version'] for _, _, state in self._select(pipeline, device_id)), default=0)
+
+    def snapshot(self, pipeline=None, device_id=None):
+        """(version, {pipeline: {caméra: état}}) ; la version ne change qu'avec la présence."""
+        with self._changed:
+            states = {}
+            for name, device, state in self._select(pipeline, device_id):
+                states.setdefault(name, {})[device] = dict(state)
+            return self._version(pipeline, device_id), states
+
+    def wait(self, version, timeout, pipeline=None, device_id=None):
+        """Attend (au plus `timeout` s) que la version des états demandés diffère de `version`."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._version(pipeline, device_id) != version, timeout)
+
+
+class PresenceStateMachine:
+    """Présence lissée d'une caméra et cadence de l'inférence.
+
+    La présence lissée ne change qu'après `present_after` (ou `absent_after`)
+    observations consécutives contraires. Une fois la présence établie par le
+    détecteur principal (détection « sûre », sans secours), une vérification
+    rapide suffit pour les frames suivantes : needs_inference() ne redemande
+    le détecteur complet que toutes les `confirm_every` frames, ou quand la
+    vérification rapide n'est pas concluante.
+    """
+
+    def __init__(self, present_after=1, absent_after=3, confirm_every=10):
+        self.present_after = present_after
+        self.absent_after = absent_after
+        self.confirm_every = confirm_every
+        self.present = False
+        self.confident = False  # dernière inférence : présence trouvée par le détecteur principal
+        self.confirmed = 0      # frames décidées sans inférence depuis la dernière inférence
+        self._streak = 0        # observations consécutives contraires à l'état lissé
+        self._lock = threading.Lock()
+
+    def needs_inference(self):
+        with self._lock:
+            return not (self.present and self.confident) or self.confirmed >= self.confirm_every
+
+    def observe(self, presence, confident=False, inferred=True):
+        """Ajoute l'observation d'une frame ; retourne la présence lissée."""
+        with self._lock:
+            if inferred:
+                self.confirmed = 0
+                self.confident = presence and confident
+            else:
+                self.confirmed += 1
+            if presence == self.present:
+                self._streak = 0
+            else:
+                self._streak += 1
+                if self._streak >= (self.present_after if presence else self.absent_after):
+                    self.present = presence
+                    self._streak = 0
+            return self.present
+
+
+status_board = StatusBoard()
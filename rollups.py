@@ -0,0 +1,117 @@
+# Agrégats d'occupation précalculés (par méthode, caméra et minute/heure/jour)
+#
+# presence_rollups contient, pour chaque période, le nombre d'images, de
+# présences et de recours au secours. update_rollups() ne lit que les lignes de
+# presence_logs ajoutées depuis son dernier passage (rollup_state.last_id) : il
+# est appelé par l'écrivain de db_logger après chaque lot et, en tâche de fond
+# (ROLLUP_INTERVAL), par l'interface graphique, ce qui couvre aussi les anciens
+# scripts. La route /stats ne fait que lire les agrégats.
+import sqlite3
+import sys
+from database_setup import DB_PATH, ensure_schema, reset_rollups
+
+# Granularité -> longueur du préfixe de timestamp ('YYYY-MM-DD HH:MM:SS', heure locale)
+GRANULARITIES = {'minute': 16, 'hour': 13, 'day': 10}
+
+BATCH_SIZE = 5000  # lignes de presence_logs agrégées par transaction
+
+
+def update_rollups(conn, batch_size=BATCH_SIZE):
+    """Agrège les nouvelles lignes ; retourne le nombre de lignes traitées."""
+    processed = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')  # un seul processus agrège une même ligne
+        try:
+            last_id = conn.execute("SELECT last_id FROM rollup_state WHERE name = 'presence_logs'").fetchone()[0]
+            upper_id = conn.execute('SELECT MAX(id) FROM presence_logs WHERE id <= ?',
+                                    (last_id + batch_size,)).fetchone()[0]
+            if upper_id is None or upper_id <= last_id:
+                conn.execute('COMMIT')
+                return processed
+            for granularity, length in GRANULARITIES.items():
+                conn.execute('''
+                    INSERT INTO presence_rollups (granularity, bucket, method_id, device_id,
+                                                  frames, presences, fallbacks)
+                    SELECT ?, substr(timestamp, 1, ?), method_id, COALESCE(device_id, ''),
+                           COUNT(*), SUM(presence), SUM(fallback_used)
+                    FROM presence_logs
+                    WHERE id > ? AND id <= ? AND method_id IS NOT NULL AND timestamp IS NOT NULL
+                    GROUP BY 2, 3, 4
+                    ON CONFLICT (granularity, method_id, device_id, bucket) DO UPDATE SET
+                        frames = frames + excluded.frames,
+                        presences = presences + excluded.presences,
+                        fallbacks = fallbacks + excluded.fallbacks
+                ''', (granularity, length, last_id, upper_id))
+            conn.execute("UPDATE rollup_state SET last_id = ? WHERE name = 'presence_logs'", (upper_id,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        processed += upper_id - last_id
+
+
+def query_rollups(conn, granularity='hour', method=None, device_id=None, start=None, end=None, limit=500):
+    """Périodes les plus récentes d'abord : liste de dicts (bucket, method, device_id, compteurs, taux)."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    conditions, params = ['r.granularity = ?'], [granularity]
+    if method:
+        conditions.append('m.name = ?')
+        params.append(method)
+    if device_id is not None:
+        conditions.append('r.device_id = ?')
+        params.append(device_id)
+    if start:
+        conditions.append('r.bucket >= ?')
+        params.append(start[:GRANULARITIES[granularity]])
+    if end:
+        conditions.append('r.bucket <= ?')
+        params.append(end[:GRANULARITIES[granularity]])
+    rows = conn.execute(f'''
+        SELECT r.bucket, m.name, r.device_id, r.frames, r.presences, r.fallbacks
+        FROM presence_rollups r JOIN methods m ON m.method_id = r.method_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY r.bucket DESC
+        LIMIT ?
+    ''', params + [limit]).fetchall()
+    return [_with_rates({'bucket': bucket, 'method': name, 'device_id': device, 'frames': frames,
+                         'presences': presences, 'fallbacks': fallbacks})
+            for bucket, name, device, frames, presences, fallbacks in rows]
+
+
+def method_totals(conn, start=None, end=None):
+    """Totaux par méthode, calculés sur les agrégats journaliers."""
+    conditions, params = ["r.granularity = 'day'"], []
+    if start:
+        conditions.append('r.bucket >= ?')
+        params.append(start[:GRANULARITIES['day']])
+    if end:
+        conditions.append('r.bucket <= ?')
+        params.append(end[:GRANULARITIES['day']])
+    rows = conn.execute(f'''
+        SELECT m.name, SUM(r.frames), SUM(r.presences), SUM(r.fallbacks)
+        FROM presence_rollups r JOIN methods m ON m.method_id = r.method_id
+        WHERE {' AND '.join(conditions)}
+        GROUP BY m.name
+        ORDER BY m.name
+    ''', params).fetchall()
+    return [_with_rates({'method': name, 'frames': frames, 'presences': presences, 'fallbacks': fallbacks})
+            for name, frames, presences, fallbacks in rows]
+
+
+def _with_rates(row):
+    frames = row['frames'] or 0
+    row['presence_rate'] = row['presences'] / frames if frames else None
+    row['fallback_rate'] = row['fallbacks'] / frames if frames else None
+    return row
+
+
+if __name__ == '__main__':
+    # python rollups.py          : rattrapage des agrégats
+    # python rollups.py --rebuild : recalcul complet
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    ensure_schema(conn)
+    if '--rebuild' in sys.argv:
+        reset_rollups(conn)
+    print(f"[INFO] {update_rollups(conn)} row(s) aggregated.")
+    conn.close()
@@ -1,50 +1,503 @@
-from flask import Flask, request, render_template, jsonify
-import sqlite3
-
-app = Flask(__name__)
-DATABASE_FILE = 'presence.db'
-
-
-@app.route('/', methods=['GET'])
-def show_history():
-    method_filter = request.args.get('method', None)
-    
-    try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        c = conn.cursor()
-        
-        if method_filter:
-            c.execute('''
-                SELECT filename, presence, fallback_used, method, timestamp, try_id
-                FROM presence_logs
-                WHERE method = ?
-                ORDER BY timestamp DESC
-                LIMIT 150
-            ''', (method_filter,))
-        else:
-            c.execute('''
-                SELECT filename, presence, fallback_used, method, timestamp, try_id
-                FROM presence_logs
-                ORDER BY timestamp DESC
-                LIMIT 150
-            ''')
-
-        records = c.fetchall()
-        conn.close()
-        print("RECORDS:", records)
-
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({'records': records})
-
-        return render_template('history.html', records=records, method_filter=method_filter)
-        
-    except Exception as e:
-        return f"<p><strong>Error:</strong> {e}</p>", 500
-
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5010 )  # Port 50010 for the history server
-# -*- coding: utf-8 -*- 
-# This script sets up a Flask server to display the history of presence detection results.
-# It connects to a SQLite database to retrieve and display records.         
-# It also supports filtering by detection method via query parameters.
\ No newline at end of file
+from flask import Flask, request, render_template, jsonify, Response
+from collections import OrderedDict
+from contextlib import contextmanager
+import functools
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from rollups import GRANULARITIES, method_totals, query_rollups, update_rollups
+
+app = Flask(__name__)
+DATABASE_FILE = 'presence.db'
+
+HISTORY_LIMIT = 150      # rows shown when the page is loaded
+DELTA_LIMIT = 1000       # max rows returned by one /records call
+PAGE_LIMIT = 100         # default page size of /api/history (at most DELTA_LIMIT)
+STREAM_CHUNK = 100       # rows fetched from SQLite at a time while streaming a page
+POLL_INTERVAL = 0.5      # seconds between two PRAGMA data_version checks
+KEEPALIVE_INTERVAL = 15  # seconds between two SSE keep-alive comments
+CACHE_ENTRIES = 128      # responses kept by the response cache
+READ_POOL_SIZE = 4       # idle read-only connections kept open
+ROLLUP_INTERVAL = 60     # seconds between two background rollup catch-ups (0 = never)
+
+# Columns sent to the page; the id (last column) is the cursor for the live feed
+COLUMNS = 'filename, presence, fallback_used, method, timestamp, try_id, id'
+
+
+def fetch_since(conn, since_id, method_filter=None, limit=DELTA_LIMIT):
+    """Rows inserted after `since_id`, oldest first."""
+    if method_filter:
+        return conn.execute(f'''
+            SELECT {COLUMNS} FROM presence_logs
+            WHERE id > ? AND method = ?
+            ORDER BY id
+            LIMIT ?
+        ''', (since_id, method_filter, limit)).fetchall()
+    return conn.execute(f'''
+        SELECT {COLUMNS} FROM presence_logs
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (since_id, limit)).fetchall()
+
+
+class ReadPool:
+    """Read-only connections reused by the request threads instead of one connect() per request."""
+
+    def __init__(self, db_path, size=READ_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        return sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        clean_exit = False
+        try:
+            yield conn
+            clean_exit = True
+        finally:
+            # Returned to the pool only after a clean exit; closed on any error,
+            # including GeneratorExit when a streamed response is abandoned
+            if clean_exit and not conn.in_transaction and self._idle.qsize() < self.size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+
+class ResponseCache:
+    """LRU cache of rendered responses, emptied as soon as the database changes.
+
+    PRAGMA data_version on a dedicated connection changes whenever another
+    connection commits, so a cache hit costs one PRAGMA and no query.
+    """
+
+    def __init__(self, db_path, max_entries=CACHE_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (body, mimetype, etag)
+        self._version = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        """Return (entry or None, data version the entry must be stored under)."""
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+            try:
+                version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            except sqlite3.Error:
+                self._conn.close()
+                self._conn = None
+                raise
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return entry, version
+
+    def store(self, key, version, body, mimetype):
+        entry = (body, mimetype, hashlib.sha1(body).hexdigest()[:20])
+        with self._lock:
+            if version == self._version:  # the database may have changed while the response was built
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+
+def cached(view):
+    """Serve the view from the response cache, with ETag / If-None-Match (304) support."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path, tuple(sorted(request.args.items(multi=True))),
+               request.headers.get('X-Requested-With'))
+        try:
+            entry, version = cache.lookup(key)
+        except sqlite3.Error:
+            return view(*args, **kwargs)  # database not available yet: nothing to cache
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = cache.store(key, version, response.get_data(), response.mimetype)
+        body, mimetype, etag = entry
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'  # always revalidate, the 304 is cheap
+        response.vary.add('X-Requested-With')
+        return response.make_conditional(request)
+    return wrapper
+
+
+class Subscriber:
+    """One open SSE stream. Dropped by the feed if it falls too far behind."""
+
+    def __init__(self, method_filter=None, max_pending=1000):
+        self.method_filter = method_filter
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.closed = False
+
+    def push(self, rows):
+        if self.method_filter:
+            rows = [row for row in rows if row[3] == self.method_filter]
+        if rows:
+            try:
+                self.queue.put_nowait(rows)
+            except queue.Full:
+                self.closed = True
+
+
+class LiveFeed:
+    """Single poller shared by every dashboard.
+
+    One connection checks PRAGMA data_version (which changes whenever another
+    connection commits) and, only then, reads the new rows once and hands
+    them to every open stream.
+    """
+
+    def __init__(self, db_path, interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self.last_id = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, method_filter=None):
+        subscriber = Subscriber(method_filter)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='history-feed', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def start_at(self, last_id):
+        """Set the cursor of a feed that has not pushed anything yet.
+
+        Called by /stream with MAX(id) of the snapshot its backlog is read from,
+        so that every later row is pushed by the feed.
+        """
+        with self._lock:
+            if self.last_id is None:
+                self.last_id = last_id
+
+    def _poll(self, conn, version):
+        if self.last_id is None:
+            # No cursor yet: keep the old version so this change is picked up once it is set
+            return version
+        current = conn.execute('PRAGMA data_version').fetchone()[0]
+        if current == version:
+            return version
+        while True:
+            rows = fetch_since(conn, self.last_id)
+            if not rows:
+                break
+            self.last_id = rows[-1][-1]
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber.push(rows)
+        return current
+
+    def _run(self):
+        conn = None
+        version = None
+        while True:
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.db_path)
+                version = self._poll(conn, version)
+            except Exception as e:
+                print(f"[ERROR] History feed: {e}")
+                if conn is not None:
+                    conn.close()
+                conn, version = None, None
+            time.sleep(self.interval)
+
+
+class RollupUpdater:
+    """Background catch-up of the occupancy rollups.
+
+    db_logger updates the rollups after each batch it writes; this timer picks
+    up rows inserted by other programs, so that /stats never has to write.
+    """
+
+    def __init__(self, db_path, interval=ROLLUP_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rollup-updater', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # mode=rw: never create an empty database if the file is missing
+                conn = sqlite3.connect(f'file:{self.db_path}?mode=rw', uri=True, isolation_level=None)
+                try:
+                    processed = update_rollups(conn)
+                finally:
+                    conn.close()
+                if processed:
+                    print(f"[INFO] Rollups caught up with {processed} rows")
+            except Exception as e:
+                print(f"[ERROR] Rollup update: {e}")
+            time.sleep(self.interval)
+
+
+feed = LiveFeed(DATABASE_FILE)
+read_pool = ReadPool(DATABASE_FILE)
+cache = ResponseCache(DATABASE_FILE)
+rollup_updater = RollupUpdater(DATABASE_FILE)
+
+
+def sse_event(rows):
+    return f"id: {rows[-1][-1]}\ndata: {json.dumps(rows)}\n\n"
+
+
+@app.route('/', methods=['GET'])
+@cached
+def show_history():
+    method_filter = request.args.get('method', None)
+
+    try:
+        with read_pool.connection() as conn:
+            records, last_id = latest_records(conn, method_filter)
+
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'records': records, 'last_id': last_id})
+
+        return render_template('history.html', records=records, method_filter=method_filter)
+
+    except Exception as e:
+        return f"<p><strong>Error:</strong> {e}</p>", 500
+
+
+def latest_records(conn, method_filter=None):
+    """The HISTORY_LIMIT most recent rows, and the cursor for /records and /stream."""
+    c = conn.cursor()
+
+    if method_filter:
+        c.execute(f'''
+            SELECT {COLUMNS}
+            FROM presence_logs
+            WHERE method = ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (method_filter, HISTORY_LIMIT))
+    else:
+        c.execute(f'''
+            SELECT {COLUMNS}
+            FROM presence_logs
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (HISTORY_LIMIT,))
+
+    records = c.fetchall()
+    # Cursor for /records and /stream: the last id in the table, even if filtered out
+    last_id = c.execute('SELECT COALESCE(MAX(id), 0) FROM presence_logs').fetchone()[0]
+    return records, last_id
+
+
+# Delta API: only the rows inserted after since_id (for clients without SSE)
+@app.route('/records', methods=['GET'])
+@cached
+def records_since():
+    since_id = request.args.get('since_id', 0, type=int)
+    method_filter = request.args.get('method') or None
+    limit = min(request.args.get('limit', DELTA_LIMIT, type=int), DELTA_LIMIT)
+    try:
+        with read_pool.connection() as conn:
+            records = fetch_since(conn, since_id, method_filter, limit)
+            last_id = records[-1][-1] if records else since_id
+            if len(records) < limit:
+                # Nothing more to send for this filter: move the cursor past the filtered-out rows too
+                last_id = max(last_id, conn.execute('SELECT COALESCE(MAX(id), 0) FROM presence_logs').fetchone()[0])
+        return jsonify({'records': records, 'last_id': last_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def history_filters(args):
+    """WHERE conditions and parameters of /api/history."""
+    conditions, params = [], []
+    if args.get('method'):
+        conditions.append('method = ?')
+        params.append(args['method'])
+    if args.get('device'):
+        # Camera id sent by the ESP32 (X-Device-ID); "default" is the single-camera setup
+        conditions.append('device_id IS ?')
+        params.append(None if args['device'] == 'default' else args['device'])
+    for column in ('presence', 'fallback_used'):
+        if args.get(column) in ('0', '1'):
+            conditions.append(f'{column} = ?')
+            params.append(int(args[column]))
+    if args.get('from'):
+        conditions.append('timestamp >= ?')
+        params.append(args['from'])
+    if args.get('to'):
+        conditions.append('timestamp < ?')
+        params.append(args['to'])
+    if args.get('cursor'):
+        # Keyset pagination: rows strictly older than the last row of the previous page
+        timestamp, _, last_id = args['cursor'].rpartition('|')
+        conditions.append('(timestamp, id) < (?, ?)')
+        params += [timestamp, int(last_id)]
+    return conditions, params
+
+
+# Paginated history, newest first. The response is streamed row by row;
+# next_cursor (timestamp|id of the last row) is passed back as ?cursor= for the next page.
+@app.route('/api/history', methods=['GET'])
+def history_page():
+    limit = max(1, min(request.args.get('limit', PAGE_LIMIT, type=int), DELTA_LIMIT))
+    try:
+        conditions, params = history_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'cursor must be <timestamp>|<id>'}), 400
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    def generate():
+        with read_pool.connection() as conn:
+            c = conn.execute(f'''
+                SELECT {COLUMNS} FROM presence_logs
+                {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', params + [limit])
+            yield '{"records": ['
+            last, count = None, 0
+            while True:
+                rows = c.fetchmany(STREAM_CHUNK)
+                if not rows:
+                    break
+                for row in rows:
+                    yield (',' if count else '') + json.dumps(row)
+                    count += 1
+                last = rows[-1]
+            next_cursor = f"{last[4]}|{last[-1]}" if count == limit else None
+            yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+    return Response(generate(), mimetype='application/json')
+
+
+# Server-Sent Events: new rows are pushed as soon as they are committed
+@app.route('/stream', methods=['GET'])
+def stream():
+    method_filter = request.args.get('method') or None
+    since_id = request.args.get('since_id', 0, type=int)
+    # On reconnection the browser sends back the id of the last event it received
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id:
+        try:
+            since_id = int(last_event_id)
+        except ValueError:
+            print(f"[WARNING] Ignoring invalid Last-Event-ID: {last_event_id!r}")
+
+    # Subscribe before reading the backlog so that no row is lost in between
+    subscriber = feed.subscribe(method_filter)
+    try:
+        with read_pool.connection() as conn:
+            # Feed cursor and backlog come from the same snapshot:
+            # rows up to the cursor are in the backlog, later ones are pushed by the feed
+            conn.execute('BEGIN')
+            try:
+                head_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM presence_logs').fetchone()[0]
+                feed.start_at(head_id)
+                # One row more than the limit tells whether the whole backlog fits in one event
+                backlog = fetch_since(conn, since_id, method_filter, limit=DELTA_LIMIT + 1)
+            finally:
+                conn.execute('COMMIT')
+    except Exception:
+        feed.unsubscribe(subscriber)
+        raise
+
+    def events():
+        sent_id = since_id
+        try:
+            yield "retry: 3000\n\n"
+            if len(backlog) > DELTA_LIMIT:
+                # Too far behind: the page reloads its table (/ and /api/history), then follows from head_id
+                sent_id = head_id
+                yield f"event: reset\nid: {head_id}\ndata: {json.dumps({'last_id': head_id})}\n\n"
+            elif backlog:
+                sent_id = backlog[-1][-1]
+                yield sse_event(backlog)
+            while not subscriber.closed:
+                try:
+                    rows = subscriber.queue.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                rows = [row for row in rows if row[-1] > sent_id]
+                if rows:
+                    sent_id = rows[-1][-1]
+                    yield sse_event(rows)
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Occupancy statistics, read from the rollup tables only (see rollups.py);
+# rows written by other programs are aggregated by the background RollupUpdater
+@app.route('/stats', methods=['GET'])
+@cached
+def stats():
+    rollup_updater.start()
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+    start, end = request.args.get('from'), request.args.get('to')
+    try:
+        with read_pool.connection() as conn:
+            series = query_rollups(conn, granularity, method=request.args.get('method') or None,
+                                   device_id=request.args.get('device'), start=start, end=end,
+                                   limit=request.args.get('limit', 500, type=int))
+            totals = method_totals(conn, start, end)
+        return jsonify({'granularity': granularity, 'series': series, 'totals': totals})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+if __name__ == '__main__':
+    rollup_updater.start()
+    app.run(host='0.0.0.0', port=5010, threaded=True)  # Port 50010 for the history server
+# -*- coding: utf-8 -*-
+# This script sets up a Flask server to display the history of presence detection results.
+# It connects to a SQLite database to retrieve and display records.
+# It also supports filtering by detection method via query parameters.
+# New rows are pushed to the page through /stream (SSE) or fetched through /records?since_id=.
+# Occupancy charts come from /stats, which only reads the precomputed rollups.
+# Older rows are paged through /api/history (keyset pagination on timestamp, id).
@@ -0,0 +1,231 @@
+# Moteur de détection de changement par SSIM (Structural Similarity Index)
+#
+# Le SSIM est calculé sur une version réduite (pyramide gaussienne) des images
+# en niveaux de gris, tuile par tuile, à partir d'images intégrales : les
+# statistiques locales de chaque fenêtre 7x7 (moyennes, variances, covariance)
+# s'obtiennent en 4 lectures, sans construire la carte SSIM complète.
+# Le calcul s'arrête dès que la décision est acquise.
+import threading
+import cv2
+import numpy as np
+from frame_utils import load_reference_gray, save_reference
+
+# Mêmes constantes que skimage.metrics.structural_similarity (fenêtre uniforme 7x7)
+WIN_SIZE = 7
+K1 = 0.01
+K2 = 0.03
+DATA_RANGE = 255
+
+
+class ChangeResult:
+    """Résultat d'une comparaison avec l'image de référence.
+
+    Évalué comme un booléen : vrai si un changement (donc une présence) est détecté.
+    """
+
+    def __init__(self, changed, score, changed_tiles, tiles_checked, tiles_total, score_bound=None):
+        self.changed = changed
+        self.score = score                  # SSIM moyen de toute l'image (None si le calcul s'est arrêté avant)
+        self.score_bound = score_bound      # majorant du SSIM moyen, en cas d'arrêt anticipé
+        self.changed_tiles = changed_tiles  # [(ligne, colonne, score_tuile), ...] parmi les tuiles évaluées
+        self.tiles_checked = tiles_checked
+        self.tiles_total = tiles_total
+
+    def __bool__(self):
+        return self.changed
+
+    @property
+    def early_exit(self):
+        return self.tiles_checked < self.tiles_total
+
+
+def downscale(gray, levels):
+    """Descend de `levels` niveaux dans la pyramide gaussienne (division par 2 à chaque niveau)."""
+    for _ in range(levels):
+        if min(gray.shape[:2]) < 2 * WIN_SIZE:
+            break
+        gray = cv2.pyrDown(gray)
+    return gray
+
+
+def _integrals(gray):
+    """Images intégrales de x et x² (avec une ligne et une colonne de zéros en tête)."""
+    s, sq = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    return s, sq
+
+
+def _window_sums(integral, r0, r1, c0, c1):
+    """Sommes sur les fenêtres WIN_SIZE x WIN_SIZE dont le coin haut-gauche est dans [r0:r1, c0:c1]."""
+    w = WIN_SIZE
+    return (integral[r0 + w:r1 + w, c0 + w:c1 + w] - integral[r0:r1, c0 + w:c1 + w]
+            - integral[r0 + w:r1 + w, c0:c1] + integral[r0:r1, c0:c1])
+
+
+class _Statistics:
+    """Images intégrales d'une image en niveaux de gris réduite."""
+
+    def __init__(self, gray):
+        self.gray = gray
+        self.sum, self.sqsum = _integrals(gray)
+
+
+def compare_gray(reference, current, threshold=0.9, grid=(4, 4)):
+    """Compare deux images en niveaux de gris de même taille (déjà réduites).
+
+    `reference` et `current` peuvent être des tableaux numpy ou des _Statistics
+    (pour réutiliser les intégrales de la référence d'un appel à l'autre).
+
+    Décision (comme avant) : changement si le SSIM moyen de toute l'image est
+    inférieur à `threshold`. Les tuiles dont le SSIM est sous le seuil sont
+    listées à titre d'information. Le calcul s'arrête dès que la moyenne est
+    forcément sous le seuil ; le score exact n'est alors pas connu (score None,
+    score_bound en donne un majorant).
+    """
+    ref = reference if isinstance(reference, _Statistics) else _Statistics(reference)
+    cur = current if isinstance(current, _Statistics) else _Statistics(current)
+
+    # Image intégrale du produit croisé x*y, seule statistique propre au couple
+    cross = cv2.integral(ref.gray.astype(np.float64) * cur.gray, sdepth=cv2.CV_64F)
+
+    # Carte SSIM "valide" (sans les bords), comme skimage
+    height = ref.gray.shape[0] - WIN_SIZE + 1
+    width = ref.gray.shape[1] - WIN_SIZE + 1
+    rows = np.linspace(0, height, min(grid[0], height) + 1).astype(int)
+    cols = np.linspace(0, width, min(grid[1], width) + 1).astype(int)
+    tiles_total = (len(rows) - 1) * (len(cols) - 1)
+
+    n = WIN_SIZE * WIN_SIZE
+    cov_norm = n / (n - 1)
+    c1 = (K1 * DATA_RANGE) ** 2
+    c2 = (K2 * DATA_RANGE) ** 2
+
+    total_pixels = height * width
+    remaining_pixels = total_pixels
+    ssim_sum = 0.0
+    pixels_checked = 0
+    tiles_checked = 0
+    changed_tiles = []
+
+    for i in range(len(rows) - 1):
+        for j in range(len(cols) - 1):
+            r0, r1, c0, c1_ = rows[i], rows[i + 1], cols[j], cols[j + 1]
+
+            ux = _window_sums(ref.sum, r0, r1, c0, c1_) / n
+            uy = _window_sums(cur.sum, r0, r1, c0, c1_) / n
+            uxx = _window_sums(ref.sqsum, r0, r1, c0, c1_) / n
+            uyy = _window_sums(cur.sqsum, r0, r1, c0, c1_) / n
+            uxy = _window_sums(cross, r0, r1, c0, c1_) / n
+
+            vx = cov_norm * (uxx - ux * ux)
+            vy = cov_norm * (uyy - uy * uy)
+            vxy = cov_norm * (uxy - ux * uy)
+
+            s = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+
+            tile_sum = float(s.sum())
+            ssim_sum += tile_sum
+            pixels_checked += s.size
+            remaining_pixels -= s.size
+            tiles_checked += 1
+
+            tile_score = tile_sum / s.size
+            if tile_score < threshold:
+                changed_tiles.append((i, j, tile_score))
+
+            # Arrêt anticipé : même un SSIM de 1 sur le reste de l'image
+            # ne ramènerait pas la moyenne au-dessus du seuil
+            bound = (ssim_sum + remaining_pixels) / total_pixels
+            if remaining_pixels and bound < threshold:
+                return ChangeResult(True, None, changed_tiles, tiles_checked, tiles_total, score_bound=bound)
+
+    score = ssim_sum / pixels_checked
+    return ChangeResult(bool(score < threshold), score, changed_tiles, tiles_checked, tiles_total)
+
+
+class ChangeDetector:
+    """Détecteur de changement par rapport à une image de référence stockée sur le disque.
+
+    La référence réduite et ses images intégrales sont calculées une seule
+    fois, puis réutilisées tant que le fichier n'est pas modifié.
+    """
+
+    def __init__(self, reference_path, threshold=0.9, levels=2, grid=(4, 4)):
+        self.reference_path = reference_path
+        self.threshold = threshold
+        self.levels = levels
+        self.grid = grid
+        self._reference = None      # image de référence pleine résolution (objet en cache)
+        self._reference_stats = None
+
+    def _load_reference(self):
+        reference = load_reference_gray(self.reference_path)
+        if reference is None:
+            return None
+        if reference is not self._reference:
+            self._reference = reference
+            self._reference_stats = _Statistics(downscale(reference, self.levels))
+        return self._reference_stats
+
+    def compare(self, frame, threshold=None):
+        """Compare la frame à la référence.
+
+        Retourne None si aucune référence n'existait encore : la frame devient
+        alors la référence.
+        """
+        ref_stats = self._load_reference()
+        if ref_stats is None:
+            save_reference(self.reference_path, frame)
+            return None
+
+        # Redimensionner l'image courante pour qu'elle corresponde à la taille de l'image de référence
+        gray = frame.gray
+        if gray.shape != self._reference.shape:
+            gray = cv2.resize(gray, (self._reference.shape[1], self._reference.shape[0]))
+
+        return compare_gray(ref_stats, downscale(gray, self.levels),
+                            threshold=self.threshold if threshold is None else threshold,
+                            grid=self.grid)
+
+
+class MotionGate:
+    """Pré-filtre de mouvement placé avant le détecteur (mode « gate-first »).
+
+    Compare, à très basse résolution, la frame reçue à la dernière frame
+    réellement analysée. Si la scène n'a pas bougé, la décision précédente est
+    réutilisée et l'inférence est évitée. Une inférence est tout de même forcée
+    toutes les `max_skipped` frames.
+    """
+
+    def __init__(self, levels=3, pixel_threshold=25, motion_ratio=0.01, max_skipped=30):
+        self.levels = levels
+        self.pixel_threshold = pixel_threshold  # écart de niveau de gris considéré comme un mouvement
+        self.motion_ratio = motion_ratio        # proportion de pixels en mouvement déclenchant l'inférence
+        self.max_skipped = max_skipped
+        self.skipped = 0
+        self._last_gray = None
+        self._last_decision = None
+        self._lock = threading.Lock()
+
+    def check(self, frame):
+        """Retourne la décision précédente si la scène est inchangée, sinon None."""
+        small = downscale(frame.gray, self.levels)
+        with self._lock:
+            if self._last_decision is None or self.skipped >= self.max_skipped \
+                    or small.shape != self._last_gray.shape:
+                return None
+
+            diff = cv2.absdiff(small, self._last_gray)
+            moving = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            if moving >= self.motion_ratio:
+                return None
+
+            self.skipped += 1
+            return self._last_decision
+
+    def update(self, frame, decision):
+        """Mémorise la frame analysée et la décision du détecteur."""
+        small = downscale(frame.gray, self.levels)
+        with self._lock:
+            self._last_gray = small
+            self._last_decision = decision
+            self.skipped = 0
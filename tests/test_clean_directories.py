@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import clean_directories
+from clean_directories import RetentionTarget, sweep
+
+
+def make_images(folder, count, age_days, size=100):
+    now = os.path.getmtime(folder)
+    paths = []
+    for index in range(count):
+        path = folder / '2026' / '01' / f'{index:02d}' / f'img_{index:02d}_presence_0.jpg'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'\0' * size)
+        mtime = now - age_days * 86400 + index  # higher index: newer image
+        os.utime(path, (mtime, mtime))
+        paths.append(path)
+    return paths
+
+
+def database():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE presence_logs (filename TEXT, method TEXT, file_deleted INTEGER DEFAULT 0)')
+    return conn
+
+
+def counting_walks(monkeypatch):
+    walks = []
+    iter_images = clean_directories.iter_images
+
+    def counted(*args, **kwargs):
+        walks.append(args)
+        return iter_images(*args, **kwargs)
+
+    monkeypatch.setattr(clean_directories, 'iter_images', counted)
+    return walks
+
+
+def test_sweep_walks_the_folder_once(tmp_path, monkeypatch):
+    old = make_images(tmp_path, 12, age_days=40)
+    walks = counting_walks(monkeypatch)
+    target = RetentionTarget(str(tmp_path), ['cv2'], max_age_days=30, max_mb=0)
+
+    assert sweep(target, database(), batch_size=5, pause=0) == 12
+    assert len(walks) == 1
+    assert not any(path.exists() for path in old)
+    assert os.listdir(tmp_path) == []  # emptied date folders are removed too
+
+
+def test_sweep_size_limit_keeps_the_newest_images(tmp_path, monkeypatch):
+    paths = make_images(tmp_path, 10, age_days=1, size=1024)
+    walks = counting_walks(monkeypatch)
+    target = RetentionTarget(str(tmp_path), ['cv2'], max_age_days=30, max_mb=4 / 1024)
+
+    assert sweep(target, database(), batch_size=3, pause=0) == 6
+    assert len(walks) == 1
+    assert [path.exists() for path in paths] == [False] * 6 + [True] * 4
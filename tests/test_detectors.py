@@ -0,0 +1,82 @@
+import os
+import cv2
+import numpy as np
+import pytest
+from detectors import HaarDetector
+from frame_utils import Frame
+
+
+def scene():
+    """Image JPEG 640x480 (résolution de l'ESP32-CAM) avec quelques formes."""
+    image = np.full((480, 640, 3), 120, np.uint8)
+    cv2.rectangle(image, (100, 80), (260, 300), (200, 180, 160), -1)
+    cv2.circle(image, (450, 200), 70, (60, 60, 60), -1)
+    return Frame(cv2.imencode('.jpg', image)[1].tobytes())
+
+
+@pytest.fixture
+def haar(monkeypatch):
+    for name in ('HAAR_TRACKING', 'HAAR_FULL_SCAN_EVERY', 'HAAR_MIN_FACE', 'HAAR_MAX_FACE', 'HAAR_CAMERA_HFOV', 'HAAR_SCALE'):
+        monkeypatch.delenv(name, raising=False)
+    detector = HaarDetector()
+    detector.load()
+    return detector
+
+
+def test_scan_without_max_face(haar):
+    frame = scene()
+    min_face, max_face = haar.face_bounds(frame.gray.shape[1])
+    assert max_face is None
+    assert list(haar.scan(frame.gray, min_face, max_face)) == []
+
+
+def test_tracking_with_default_bounds(haar, monkeypatch):
+    monkeypatch.setenv('HAAR_TRACKING', '1')
+    haar.load()
+
+    class Camera:
+        reference_path = 'reference_image.jpg'
+
+    for _ in range(3):
+        assert haar.detect(scene(), Camera()) is False
+
+
+@pytest.mark.parametrize('every', ['0', '1', '-3'])
+def test_full_scan_every_frame(haar, monkeypatch, every):
+    monkeypatch.setenv('HAAR_TRACKING', '1')
+    monkeypatch.setenv('HAAR_FULL_SCAN_EVERY', every)
+    haar.load()
+    regions = []
+
+    def scan(gray, min_face, max_face, region=None):
+        regions.append(region)
+        return [(100, 80, 60, 60)]
+
+    monkeypatch.setattr(haar, 'scan', scan)
+
+    class Camera:
+        reference_path = f'reference_every_{every}.jpg'
+
+    for _ in range(3):
+        assert haar.detect(scene(), Camera()) is True
+    assert regions == [None] * 3  # jamais de recherche limitée à la zone des visages précédents
+
+
+def test_scan_with_max_face(haar):
+    frame = scene()
+    assert list(haar.scan(frame.gray, 30, 200)) == []
+
+
+def test_load_sample_images_walks_date_shards(tmp_path):
+    from yolov3_detector import load_sample_images
+
+    # Frames rangées par jour (et par caméra), plus une image de référence ignorée
+    for index, relative in enumerate(['2026/01/01/old.jpg', '2026/01/02/mid.jpg',
+                                      'devices/cam1/2026/01/03/new.jpg', 'reference_image.jpg']):
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(path), np.full((8, 8, 3), 10 * (index + 1), np.uint8))
+        os.utime(path, (1000 + index, 1000 + index))
+
+    images = load_sample_images(str(tmp_path), limit=2)
+    assert [int(image[0, 0, 0]) for image in images] == [30, 20]
@@ -0,0 +1,39 @@
+import threading
+import time
+from inference_scheduler import BatchScheduler
+
+
+class FakeModel:
+    """Renvoie ses entrées ; bloque tant que `gate` n'est pas ouverte."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def __call__(self, images, verbose=False):
+        self.started.set()
+        self.gate.wait(5)
+        return list(images)
+
+
+def test_lone_request_does_not_wait_for_the_window():
+    scheduler = BatchScheduler(FakeModel(), window_ms=500)
+    started = time.monotonic()
+    assert scheduler.predict('frame') == 'frame'
+    assert time.monotonic() - started < 0.25
+    assert scheduler.stats()['batch_size_distribution'] == {'1': 1}
+
+
+def test_frames_queued_during_an_inference_form_the_next_batch():
+    model = FakeModel()
+    scheduler = BatchScheduler(model, window_ms=50)
+    model.gate.clear()
+    first = scheduler.submit('a')
+    assert model.started.wait(5)
+    others = [scheduler.submit(name) for name in 'bcd']
+    model.gate.set()
+
+    assert first.result(5) == 'a'
+    assert [future.result(5) for future in others] == ['b', 'c', 'd']
+    assert scheduler.stats()['batch_size_distribution'] == {'1': 1, '3': 1}
@@ -0,0 +1,103 @@
+import io
+import os
+import cv2
+import numpy as np
+import pytest
+import presence_server
+from database_setup import init_db
+from db_logger import get_logger
+from presence_server import BATCH_HEADER, create_app, parse_capture_time
+
+
+def jpeg():
+    image = np.full((240, 320, 3), 100, np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # Dossiers uploads_* et presence.db créés dans un dossier temporaire
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('server'))
+    init_db()
+    try:
+        yield create_app('ssim').test_client()
+        presence_server.persistence_queue.flush(10)
+        get_logger(presence_server.DATABASE_FILE).flush(10)
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize('value', ['99999999999999999999', str(10 ** 30)])
+def test_parse_capture_time_out_of_range(value):
+    with pytest.raises(ValueError):
+        parse_capture_time(value)
+
+
+def test_raw_upload_out_of_range_capture_time(client):
+    response = client.post('/uploads/raw', data=jpeg(), content_type='application/octet-stream',
+                           headers={'X-Capture-Time': '99999999999999999999'})
+    assert response.status_code == 400
+    assert response.data == b"Invalid X-Capture-Time"
+
+
+def test_form_upload_out_of_range_timestamp(client):
+    response = client.post('/uploads', data={'imageFile': (io.BytesIO(jpeg()), 'frame.jpg'),
+                                             'timestamp': '99999999999999999999'})
+    assert response.status_code == 400
+
+
+def test_batch_out_of_range_timestamp_is_a_frame_error(client):
+    data = jpeg()
+    body = BATCH_HEADER.pack(2 ** 63, len(data)) + data + BATCH_HEADER.pack(0, len(data)) + data
+    response = client.post('/uploads/batch', data=body, content_type='application/octet-stream')
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0] == {'index': 0, 'error': "Invalid timestamp"}
+    assert 'presence' in results[1]
+
+
+def test_batch_frame_too_large_is_rejected(client):
+    data = jpeg()
+    body = (BATCH_HEADER.pack(0, len(data)) + data
+            + BATCH_HEADER.pack(0, presence_server.MAX_FRAME_BYTES + 1) + data
+            + BATCH_HEADER.pack(0, len(data)) + data)
+    response = client.post('/uploads/batch', data=body, content_type='application/octet-stream')
+    assert response.status_code == 413
+    payload = response.get_json()
+    assert payload['error'] == "Frame 1 too large"
+    assert [result['index'] for result in payload['results']] == [0]
+
+
+def test_batch_truncated_header_is_rejected(client):
+    data = jpeg()
+    body = BATCH_HEADER.pack(0, len(data)) + data + b'\x00\x00\x00'
+    response = client.post('/uploads/batch', data=body, content_type='application/octet-stream')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Truncated header for frame 1"
+
+
+def test_dropped_status_write_is_retried_on_next_frame(client, monkeypatch):
+    queue = presence_server.persistence_queue
+    headers = {'X-Device-ID': 'dropcam'}
+    status_file = presence_server.get_pipeline('ssim').camera('dropcam').status_file
+
+    # File de persistance pleine (PERSIST_ON_FULL=drop) : la tâche de la première frame est abandonnée
+    monkeypatch.setattr(queue, 'submit', lambda task, *args: False)
+    first = client.post('/uploads/raw', data=jpeg(), content_type='application/octet-stream', headers=headers)
+    assert first.status_code == 200
+    monkeypatch.undo()
+
+    # Même présence à la frame suivante : status.txt est tout de même écrit
+    second = client.post('/uploads/raw', data=jpeg(), content_type='application/octet-stream', headers=headers)
+    assert second.status_code == 200
+    queue.flush(10)
+    with open(status_file) as f:
+        assert f.read() == ('1' if second.data == b"Presence Detected" else '0')
+
+
+def test_flush_on_exit_does_not_create_a_logger(monkeypatch):
+    import db_logger
+    monkeypatch.setattr(db_logger, '_logger', None)
+    presence_server.flush_on_exit()
+    assert db_logger._logger is None
@@ -0,0 +1,18 @@
+from presence_status import StatusBoard
+
+
+def test_status_board_evicts_least_recently_seen_cameras():
+    board = StatusBoard(max_devices=2)
+    board.update('ssim', True, 'ssim', 'a.jpg', 'cam-a')
+    board.update('ssim', True, 'ssim', 'b.jpg', 'cam-b')
+    board.update('ssim', True, 'ssim', 'a2.jpg', 'cam-a')  # cam-a revue : cam-b devient la plus ancienne
+    board.update('ssim', False, 'ssim', 'c.jpg', 'cam-c')
+    board.update('haar', True, 'haar', 'd.jpg', 'cam-b')   # borne propre à chaque pipeline
+
+    _, states = board.snapshot()
+    assert sorted(states['ssim']) == ['cam-a', 'cam-c']
+    assert states['ssim']['cam-a']['filename'] == 'a2.jpg'
+    assert sorted(states['haar']) == ['cam-b']
+
+    # Une caméra évincée repart d'un état neuf : sa prochaine décision est un changement
+    assert board.update('ssim', True, 'ssim', 'b2.jpg', 'cam-b')
@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import time
+import pytest
+import serveur_int_graphique
+from database_setup import init_db
+from serveur_int_graphique import LiveFeed, ReadPool, RollupUpdater
+
+
+def insert_row(db_path, filename):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        row_id = conn.execute('''
+            INSERT INTO presence_logs (filename, presence, fallback_used, method, timestamp, try_id)
+            VALUES (?, 1, 0, 'ssim', '2026-01-01 12:00:00', 1)
+        ''', (filename,)).lastrowid
+    conn.close()
+    return row_id
+
+
+@pytest.fixture(scope='module')
+def db_path(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('history'))
+    init_db()
+    try:
+        yield os.path.abspath(serveur_int_graphique.DATABASE_FILE)
+    finally:
+        os.chdir(cwd)
+
+
+def test_feed_pushes_rows_committed_before_its_cursor_is_set(db_path):
+    head_id = insert_row(db_path, 'before.jpg')
+    feed = LiveFeed(db_path, interval=0.05)
+    subscriber = feed.subscribe()
+    # Row committed between the backlog read and the cursor being set
+    later_id = insert_row(db_path, 'after.jpg')
+    feed.start_at(head_id)
+
+    rows = subscriber.queue.get(timeout=5)
+    assert [row[-1] for row in rows] == [later_id]
+
+
+def test_stream_ignores_invalid_last_event_id(db_path):
+    row_id = insert_row(db_path, 'stream.jpg')
+    client = serveur_int_graphique.app.test_client()
+    response = client.get(f'/stream?since_id={row_id - 1}', headers={'Last-Event-ID': 'not-a-number'},
+                          buffered=False)
+    assert response.status_code == 200
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    assert next(chunks).startswith(f'id: {row_id}\n'.encode())
+    response.close()
+
+
+def test_stream_resets_a_client_too_far_behind(db_path, monkeypatch):
+    monkeypatch.setattr(serveur_int_graphique, 'DELTA_LIMIT', 5)
+    first_id = insert_row(db_path, 'gap-0.jpg')
+    for index in range(1, 8):
+        head_id = insert_row(db_path, f'gap-{index}.jpg')
+    client = serveur_int_graphique.app.test_client()
+
+    # More than DELTA_LIMIT rows missed: reset event pointing at the newest row
+    response = client.get(f'/stream?since_id={first_id - 1}', buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    assert next(chunks).decode() == f'event: reset\nid: {head_id}\ndata: {{"last_id": {head_id}}}\n\n'
+    response.close()
+
+    # Exactly DELTA_LIMIT rows missed: all of them are sent, up to the newest one
+    response = client.get(f'/stream?since_id={head_id - 5}', buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    event = next(chunks).decode()
+    assert event.startswith(f'id: {head_id}\n')
+    assert [row[-1] for row in json.loads(event.split('data: ', 1)[1])] == list(range(head_id - 4, head_id + 1))
+    response.close()
+
+
+def test_read_pool_returns_or_closes_every_connection(db_path):
+    pool = ReadPool(db_path, size=1)
+    with pool.connection() as conn:
+        conn.execute('SELECT 1')
+    assert pool._idle.qsize() == 1
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError
+    assert pool._idle.qsize() == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+    # Streamed response abandoned by the client: the generator is closed mid-way
+    def rows():
+        with pool.connection() as conn:
+            yield conn
+            yield None
+
+    stream = rows()
+    conn = next(stream)
+    stream.close()
+    assert pool._idle.qsize() == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+
+def rollup_cursor(db_path):
+    conn = sqlite3.connect(db_path)
+    last_id = conn.execute("SELECT last_id FROM rollup_state WHERE name = 'presence_logs'").fetchone()[0]
+    conn.close()
+    return last_id
+
+
+def test_stats_only_reads_and_the_updater_catches_up(db_path, monkeypatch):
+    monkeypatch.setattr(serveur_int_graphique, 'rollup_updater', RollupUpdater(db_path, interval=0))
+    row_id = insert_row(db_path, 'stats.jpg')
+    before = rollup_cursor(db_path)
+    assert before < row_id
+
+    response = serveur_int_graphique.app.test_client().get('/stats?granularity=day')
+    assert response.status_code == 200
+    assert rollup_cursor(db_path) == before
+
+    RollupUpdater(db_path, interval=0.05).start()
+    deadline = time.monotonic() + 5
+    while rollup_cursor(db_path) < row_id and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert rollup_cursor(db_path) == row_id
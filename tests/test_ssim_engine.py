@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from ssim_engine import compare_gray
+
+structural_similarity = pytest.importorskip('skimage.metrics').structural_similarity
+
+
+def reference():
+    rng = np.random.default_rng(1)
+    return rng.integers(60, 200, (120, 160)).astype(np.uint8)
+
+
+def full_ssim(a, b):
+    return structural_similarity(a, b, win_size=7, data_range=255)
+
+
+def test_local_changes_do_not_override_mean_threshold():
+    ref = reference()
+    cur = ref.copy()
+    # Trois tuiles de la grille 4x4 modifiées : SSIM moyen encore au-dessus de 0.8
+    cur[:30, :40] = 255 - cur[:30, :40]
+    cur[:30, 40:80] = 255 - cur[:30, 40:80]
+    cur[30:60, :40] = 255 - cur[30:60, :40]
+    expected = full_ssim(ref, cur)
+    threshold = expected - 0.05
+
+    result = compare_gray(ref, cur, threshold=threshold)
+    assert not result
+    assert len(result.changed_tiles) >= 3
+    assert result.score == pytest.approx(expected, abs=1e-6)
+
+
+def test_early_exit_reports_no_partial_score():
+    ref = reference()
+    cur = 255 - ref
+    expected = full_ssim(ref, cur)
+
+    result = compare_gray(ref, cur, threshold=0.9)
+    assert result
+    assert result.early_exit
+    assert result.score is None
+    assert expected <= result.score_bound < 0.9
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.9, 0.99])
+def test_decision_matches_full_frame_ssim(threshold):
+    ref = reference()
+    rng = np.random.default_rng(2)
+    cur = np.clip(ref.astype(int) + rng.integers(-25, 25, ref.shape), 0, 255).astype(np.uint8)
+    expected = full_ssim(ref, cur)
+
+    result = compare_gray(ref, cur, threshold=threshold)
+    assert bool(result) == (expected < threshold)
+    if result.score is not None:
+        assert result.score == pytest.approx(expected, abs=1e-6)
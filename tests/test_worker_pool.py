@@ -0,0 +1,35 @@
+import os
+import signal
+import numpy as np
+import pytest
+from frame_utils import Frame
+from worker_pool import DetectorPool, WorkerCrashed
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, 'SIGKILL'), reason="POSIX signals required")
+
+
+@pytest.fixture
+def pool():
+    pool = DetectorPool('haar', workers=1, queue_size=1, slot_bytes=64 * 64 * 3, timeout_ms=30000)
+    assert pool.wait_ready(60), pool.error
+    yield pool
+    pool.close()
+
+
+def test_dead_worker_fails_its_frames_and_is_replaced(pool):
+    frame = Frame.wrap(np.zeros((64, 64, 3), dtype=np.uint8))
+    assert pool.detect(frame) is False
+
+    process = pool._workers[0].process
+    os.kill(process.pid, signal.SIGSTOP)
+    future = pool.submit(frame)
+    os.kill(process.pid, signal.SIGKILL)
+
+    with pytest.raises(WorkerCrashed):
+        future.result(timeout=10)
+    assert pool.describe()['in_flight'] == 0
+    assert pool._free.qsize() == pool.capacity
+
+    assert pool.wait_ready(60)
+    assert pool.detect(frame) is False
+    assert pool.describe()['restarts'] == 1
@@ -0,0 +1,304 @@
+# Pool de processus de détection (une réplique du modèle par processus)
+#
+# Le processus Flask copie l'image décodée dans un emplacement de mémoire
+# partagée (aucun pickle de l'image) et n'envoie aux processus de travail que
+# l'indice de cet emplacement. Le nombre d'emplacements borne la file
+# d'attente : quand ils sont tous occupés, la requête est refusée tout de
+# suite (PoolOverloaded) au lieu de s'empiler.
+#
+# Chaque processus de travail a sa propre file de travaux et son propre tube
+# de résultats : on sait ainsi quelles frames il détient, et sa mort ne peut
+# pas laisser un verrou partagé bloqué. S'il meurt (segfault, OOM killer...), ses frames
+# échouent aussitôt (WorkerCrashed), leurs emplacements sont libérés et un
+# processus de remplacement est démarré.
+import atexit
+import itertools
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+from inference_scheduler import InferenceTimeout
+
+# Taille d'un emplacement : une image UXGA (1600x1200, taille maximale de l'ESP32-CAM) en BGR
+DEFAULT_SLOT_BYTES = 1600 * 1200 * 3
+
+# Intervalle (s) de vérification des processus de travail
+WORKER_CHECK_SECONDS = 1
+
+
+class PoolOverloaded(Exception):
+    """Levée quand toutes les places du pool sont occupées."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Detector pool overloaded, retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+class WorkerCrashed(Exception):
+    """Levée pour les frames d'un processus de travail mort avant d'avoir répondu."""
+
+
+def _worker_main(detector_name, worker_id, slot_names, jobs, results):
+    """Boucle d'un processus de travail : charge sa propre réplique du détecteur puis traite les frames."""
+    from detectors import get_detector
+    from frame_utils import Frame
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    try:
+        detector = get_detector(detector_name)
+    except Exception as e:
+        results.send(('failed', worker_id, str(e)))
+        return
+    results.send(('ready', worker_id, detector.method_tag))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, slot, shape, options = job
+        image = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+        try:
+            presence = bool(detector.detect(Frame.wrap(image), None, **options))
+            results.send(('result', job_id, presence))
+        except Exception as e:
+            results.send(('error', job_id, str(e)))
+
+    for shm in slots:
+        shm.close()
+
+
+class _Worker:
+    """Un processus de travail, sa file de travaux, son tube de résultats et le nombre de frames qu'il détient."""
+
+    def __init__(self, context, pool, index):
+        self.index = index
+        self.ready = False
+        self.dead = False
+        self.in_flight = 0
+        self.jobs = context.Queue()
+        self.results, writer = context.Pipe(duplex=False)
+        self.process = context.Process(target=_worker_main,
+                                       args=(pool.name, index, pool.slot_names, self.jobs, writer),
+                                       name=f"{pool.name}-worker-{index}", daemon=True)
+        self.process.start()
+        # Seul le processus de travail garde l'extrémité d'écriture : sa mort ferme le tube
+        writer.close()
+
+
+class DetectorPool:
+    """Pool de `workers` processus exécutant le détecteur `detector_name`.
+
+    Au plus `workers + queue_size` frames sont en cours de traitement ou en attente.
+    S'utilise comme un Detector : detect(frame, context, **options).
+    """
+
+    def __init__(self, detector_name, workers=2, queue_size=4, slot_bytes=DEFAULT_SLOT_BYTES, timeout_ms=5000):
+        self.name = detector_name
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout_ms / 1000
+        self.method_tag = ''
+        self.state = 'loading'
+        self.error = None
+        self.ready_workers = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._closing = False
+        self._started_at = time.monotonic()
+        self.load_seconds = None
+        self._mean_latency = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = {}  # job_id -> (future, emplacement, heure de soumission, processus)
+        self._ids = itertools.count()
+
+        self._slots = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(self.capacity)]
+        self._free = queue.Queue()
+        for slot in range(self.capacity):
+            self._free.put(slot)
+
+        # "spawn" : chaque processus repart d'un interpréteur propre (sûr avec torch et les threads Flask)
+        self._context = multiprocessing.get_context('spawn')
+        self.slot_names = [shm.name for shm in self._slots]
+        self._workers = [_Worker(self._context, self, i) for i in range(workers)]
+
+        threading.Thread(target=self._supervise, name=f"{detector_name}-pool-supervisor", daemon=True).start()
+        atexit.register(self.close)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout):
+        return self._ready.wait(timeout)
+
+    def submit(self, frame, options=None):
+        """Copie l'image dans un emplacement libre et retourne un Future (présence True/False)."""
+        image = np.ascontiguousarray(frame.image)
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame too large for the worker pool ({image.shape})")
+
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.rejected += 1
+            raise PoolOverloaded(self.retry_after())
+
+        np.ndarray(image.shape, dtype=np.uint8, buffer=self._slots[slot].buf)[...] = image
+        future = Future()
+        job_id = next(self._ids)
+        with self._lock:
+            # Processus vivant le moins chargé, de préférence déjà prêt
+            worker = min((w for w in self._workers if not w.dead),
+                         key=lambda w: (not w.ready, w.in_flight), default=None)
+            if worker is not None:
+                worker.in_flight += 1
+                self._pending[job_id] = (future, slot, time.monotonic(), worker)
+        if worker is None:
+            self._free.put(slot)
+            raise WorkerCrashed(f"No live {self.name} worker")
+        worker.jobs.put((job_id, slot, image.shape, options or {}))
+        return future
+
+    def detect(self, frame, context=None, **options):
+        future = self.submit(frame, options)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise InferenceTimeout(f"No result from {self.name} workers after {self.timeout * 1000:.0f} ms")
+
+    def _supervise(self):
+        """Reçoit les messages des processus de travail et traite la mort de chacun."""
+        while not self._closing:
+            with self._lock:
+                workers = [w for w in self._workers if not w.dead]
+            if not workers:
+                time.sleep(WORKER_CHECK_SECONDS)
+                continue
+            handles = {}
+            for worker in workers:
+                handles[worker.results] = worker
+                handles[worker.process.sentinel] = worker
+            for handle in wait(list(handles), timeout=WORKER_CHECK_SECONDS):
+                worker = handles[handle]
+                if worker.dead:
+                    continue
+                try:
+                    # Les messages envoyés avant la mort du processus sont traités d'abord
+                    while worker.results.poll():
+                        self._handle_message(worker, *worker.results.recv())
+                except (EOFError, OSError):
+                    pass
+                if not worker.process.is_alive():
+                    self._worker_died(worker)
+
+    def _handle_message(self, worker, kind, key, value):
+        if kind == 'ready':
+            with self._lock:
+                worker.ready = True
+                self.ready_workers += 1
+                self.method_tag = value
+                if self.load_seconds is None:
+                    self.load_seconds = time.monotonic() - self._started_at
+            self.state = 'ready'
+            self._ready.set()
+            print(f"[INFO] {self.name} worker {key} ready")
+        elif kind == 'failed':
+            self.error = value
+            if not self.ready:
+                self.state = 'failed'
+            print(f"[ERROR] {self.name} worker {key} failed to load: {value}")
+        else:
+            with self._lock:
+                future, slot, submitted_at, worker = self._pending.pop(key)
+                worker.in_flight -= 1
+                latency = time.monotonic() - submitted_at
+                self._mean_latency = latency if self._mean_latency is None \
+                    else 0.9 * self._mean_latency + 0.1 * latency
+            # L'emplacement n'est libéré qu'une fois le processus de travail terminé
+            self._free.put(slot)
+            if kind == 'result':
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def _worker_died(self, worker):
+        """Met en échec les frames du processus mort, libère leurs emplacements et le remplace."""
+        exit_code = worker.process.exitcode
+        with self._lock:
+            worker.dead = True
+            lost = [(job_id, job) for job_id, job in self._pending.items() if job[3] is worker]
+            for job_id, _ in lost:
+                del self._pending[job_id]
+            if worker.ready:
+                self.ready_workers -= 1
+                if self.ready_workers == 0:
+                    self.state = 'loading'
+                    self._ready.clear()
+        for _, (future, slot, _, _) in lost:
+            self._free.put(slot)
+            future.set_exception(WorkerCrashed(f"{self.name} worker {worker.index} died (exit code {exit_code})"))
+        worker.results.close()
+        worker.jobs.cancel_join_thread()
+        worker.jobs.close()
+        if self._closing:
+            return
+
+        if not worker.ready:
+            # Mort pendant le chargement (échec déjà signalé ou crash) : pas de remplacement en boucle
+            print(f"[ERROR] {self.name} worker {worker.index} exited while loading (exit code {exit_code})")
+            with self._lock:
+                if not any(not w.dead for w in self._workers) and not self.ready:
+                    self.state = 'failed'
+            return
+
+        print(f"[ERROR] {self.name} worker {worker.index} died (exit code {exit_code}), "
+              f"{len(lost)} frame(s) failed; starting a replacement")
+        replacement = _Worker(self._context, self, worker.index)
+        with self._lock:
+            self._workers[worker.index] = replacement
+            self.restarts += 1
+
+    def retry_after(self):
+        """Délai conseillé (s) : temps estimé pour écouler les frames en cours."""
+        with self._lock:
+            in_flight = len(self._pending)
+            latency = self._mean_latency or 1.0
+        return max(1, math.ceil(in_flight * latency / max(1, self.ready_workers)))
+
+    def describe(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'load_seconds': self.load_seconds,
+                'error': self.error,
+                'workers': self.workers,
+                'ready_workers': self.ready_workers,
+                'restarts': self.restarts,
+                'capacity': self.capacity,
+                'in_flight': len(self._pending),
+                'rejected': self.rejected,
+                'mean_latency_ms': self._mean_latency * 1000 if self._mean_latency is not None else None,
+            }
+
+    def close(self):
+        self._closing = True
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.jobs.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=2)
+        for shm in self._slots:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._slots = []
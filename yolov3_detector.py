@@ -0,0 +1,209 @@
+# Post-traitement vectorisé des sorties YOLOv3 (cv2.dnn), limité à la classe "person"
+import os
+import cv2
+import numpy as np
+
+PERSON_CLASS_ID = 0  # "person" est la première classe de coco.names
+
+
+def decode_person_detections(outputs, width, height, confidence_threshold=0.3,
+                             nms_threshold=0.4, apply_nms=True, class_id=PERSON_CLASS_ID):
+    """Extrait les personnes des sorties de net.forward(output_layers) en un seul passage numpy.
+
+    Une ligne est retenue si la classe "person" est la classe la plus probable et
+    que son score dépasse le seuil (même règle que l'ancienne boucle Python).
+    Retourne une liste de (x, y, w, h, confiance) en pixels, après
+    cv2.dnn.NMSBoxes si apply_nms est vrai.
+    """
+    detections = np.vstack(outputs)
+
+    # Les scores de classe de cv2.dnn sont déjà multipliés par l'objectness :
+    # un score > seuil implique une objectness > seuil, ce qui élimine d'emblée
+    # la grande majorité des lignes avant l'argmax.
+    detections = detections[detections[:, 4] > confidence_threshold]
+    if len(detections) == 0:
+        return []
+
+    scores = detections[:, 5:]
+    person_scores = scores[:, class_id]
+    mask = (person_scores > confidence_threshold) & (scores.argmax(axis=1) == class_id)
+    if not mask.any():
+        return []
+
+    people = detections[mask]
+    confidences = person_scores[mask]
+
+    # Boîtes (centre, taille) normalisées -> (x, y, w, h) en pixels
+    boxes = people[:, :4] * np.array([width, height, width, height], dtype=np.float32)
+    boxes[:, 0] -= boxes[:, 2] / 2
+    boxes[:, 1] -= boxes[:, 3] / 2
+    boxes = boxes.round().astype(int)
+
+    if apply_nms:
+        keep = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), confidence_threshold, nms_threshold)
+        keep = np.array(keep, dtype=int).flatten()
+        boxes, confidences = boxes[keep], confidences[keep]
+
+    return [(int(x), int(y), int(w), int(h), float(c)) for (x, y, w, h), c in zip(boxes, confidences)]
+
+
+# ---------- Profils d'inférence (taille d'entrée + backend/target cv2.dnn) ----------
+
+INPUT_SIZES = (320, 416, 608)
+
+# Backends et targets utilisables sur CPU (seuls ceux présents dans la build OpenCV sont proposés)
+BACKENDS = {
+    'opencv': 'DNN_BACKEND_OPENCV',
+    'openvino': 'DNN_BACKEND_INFERENCE_ENGINE',
+}
+TARGETS = {
+    'cpu': 'DNN_TARGET_CPU',
+    'cpu_fp16': 'DNN_TARGET_CPU_FP16',
+}
+
+# Profil historique du serveur : 416x416 sur le backend OpenCV
+DEFAULT_PROFILE = '416-opencv-cpu'
+
+
+class InferenceProfile:
+    """Taille d'entrée du réseau et couple backend/target cv2.dnn."""
+
+    def __init__(self, size, backend='opencv', target='cpu'):
+        self.size = size
+        self.backend = backend
+        self.target = target
+
+    @property
+    def name(self):
+        return f"{self.size}-{self.backend}-{self.target}"
+
+    @property
+    def method_tag(self):
+        """Suffixe ajouté à presence_logs.method (vide pour le profil historique)."""
+        return '' if self.name == DEFAULT_PROFILE else f" [{self.name}]"
+
+    @classmethod
+    def from_name(cls, name):
+        size, backend, target = name.split('-')
+        if backend not in BACKENDS or target not in TARGETS:
+            raise ValueError(f"Unknown YOLOv3 profile: {name}")
+        return cls(int(size), backend, target)
+
+    def apply(self, net):
+        net.setPreferableBackend(getattr(cv2.dnn, BACKENDS[self.backend]))
+        net.setPreferableTarget(getattr(cv2.dnn, TARGETS[self.target]))
+
+
+def available_profiles(sizes=INPUT_SIZES):
+    """Profils réalisables avec la build OpenCV installée."""
+    profiles = []
+    for backend, backend_const in BACKENDS.items():
+        backend_id = getattr(cv2.dnn, backend_const, None)
+        if backend_id is None:
+            continue
+        try:
+            available_targets = set(cv2.dnn.getAvailableTargets(backend_id))
+        except cv2.error:
+            continue
+        for target, target_const in TARGETS.items():
+            target_id = getattr(cv2.dnn, target_const, None)
+            if target_id is not None and target_id in available_targets:
+                profiles.extend(InferenceProfile(size, backend, target) for size in sizes)
+    return profiles
+
+
+def forward(net, output_layers, image, profile):
+    blob = cv2.dnn.blobFromImage(image, 1 / 255, (profile.size, profile.size), swapRB=True, crop=False)
+    net.setInput(blob)
+    return net.forward(output_layers)
+
+
+def time_profile(net, output_layers, profile, images, runs=2):
+    """Latence médiane (ms) d'un profil, après une inférence de chauffe."""
+    profile.apply(net)
+    forward(net, output_layers, images[0], profile)
+    timings = []
+    for _ in range(runs):
+        for image in images:
+            start = cv2.getTickCount()
+            forward(net, output_layers, image, profile)
+            timings.append((cv2.getTickCount() - start) / cv2.getTickFrequency() * 1000)
+    return float(np.median(timings))
+
+
+def autotune(net, output_layers, images, latency_budget_ms, profiles=None):
+    """Choisit le profil le plus précis (plus grande entrée) respectant le budget de latence.
+
+    À taille égale, le backend le plus rapide est retenu. Les tailles sont
+    testées par ordre croissant et le test s'arrête dès qu'aucun profil d'une
+    taille ne respecte le budget. Si aucun ne le respecte, le plus rapide est retenu.
+    """
+    profiles = profiles or available_profiles()
+    by_size = {}
+    for profile in profiles:
+        by_size.setdefault(profile.size, []).append(profile)
+
+    best = None
+    fastest = None
+    for size in sorted(by_size):
+        timed = []
+        for profile in by_size[size]:
+            try:
+                latency = time_profile(net, output_layers, profile, images)
+            except cv2.error as e:
+                print(f"[WARNING] YOLOv3 profile {profile.name} unusable: {e}")
+                continue
+            print(f"[INFO] YOLOv3 profile {profile.name}: {latency:.1f} ms")
+            timed.append((latency, profile))
+        if not timed:
+            continue
+
+        latency, profile = min(timed, key=lambda t: t[0])
+        if fastest is None or latency < fastest[0]:
+            fastest = (latency, profile)
+        if latency > latency_budget_ms:
+            break
+        best = (latency, profile)
+
+    chosen = best or fastest
+    if chosen is None:
+        return InferenceProfile.from_name(DEFAULT_PROFILE)
+    print(f"[INFO] YOLOv3 auto-tune selected {chosen[1].name} ({chosen[0]:.1f} ms, budget {latency_budget_ms:.0f} ms)")
+    return chosen[1]
+
+
+def load_sample_images(folder, limit=3):
+    """Les `limit` images reçues les plus récentes pour l'auto-réglage, ou une image neutre à défaut.
+
+    Les frames sont rangées par jour (AAAA/MM/JJ/, éventuellement sous devices/<id>/) :
+    tout le dossier est parcouru et les plus récentes sont choisies par date de modification.
+    """
+    candidates = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.endswith('.jpg') and name != 'reference_image.jpg':
+                path = os.path.join(root, name)
+                try:
+                    candidates.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue  # supprimée entre-temps (purge)
+
+    images = []
+    for _, path in sorted(candidates, reverse=True):
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+    return images or [np.full((480, 640, 3), 127, np.uint8)]
+
+
+def select_profile(net, output_layers, name, sample_folder, latency_budget_ms):
+    """Applique le profil demandé ('auto' lance l'auto-réglage) et le retourne."""
+    if name == 'auto':
+        profile = autotune(net, output_layers, load_sample_images(sample_folder), latency_budget_ms)
+    else:
+        profile = InferenceProfile.from_name(name)
+    profile.apply(net)
+    print(f"[INFO] YOLOv3 inference profile: {profile.name}")
+    return profile